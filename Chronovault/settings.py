@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'vault',
     'vault_admin',
     'social_django',
@@ -73,6 +74,7 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'social_django.context_processors.backends',
                 'social_django.context_processors.login_redirect',
+                'vault.context_processors.nav_counts',
             ],
         },
     },
@@ -96,6 +98,18 @@ DATABASES = {
 }
 
 
+# Cache
+# Point CACHE_BACKEND at a shared cache (Redis/Memcached) when running several
+# workers so catalog invalidations reach every process
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='chronovault'),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -164,6 +178,24 @@ EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
 
 RAZORPAY_KEY_ID = config('RAZORPAY_KEY_ID')
 RAZORPAY_KEY_SECRET = config('RAZORPAY_KEY_SECRET')
+RAZORPAY_WEBHOOK_SECRET = config('RAZORPAY_WEBHOOK_SECRET', default='')
+# Point at a local fake (manage.py fake_razorpay) for offline testing
+RAZORPAY_BASE_URL = config('RAZORPAY_BASE_URL', default='')
+RAZORPAY_CONNECT_TIMEOUT = config('RAZORPAY_CONNECT_TIMEOUT', default=3.05, cast=float)
+RAZORPAY_READ_TIMEOUT = config('RAZORPAY_READ_TIMEOUT', default=10, cast=float)
+RAZORPAY_MAX_RETRIES = config('RAZORPAY_MAX_RETRIES', default=2, cast=int)
+RAZORPAY_POOL_SIZE = config('RAZORPAY_POOL_SIZE', default=10, cast=int)
+RAZORPAY_BREAKER_THRESHOLD = config('RAZORPAY_BREAKER_THRESHOLD', default=5, cast=int)
+RAZORPAY_BREAKER_RESET_SECONDS = config('RAZORPAY_BREAKER_RESET_SECONDS', default=30, cast=int)
+
+# How long stock stays held for an online checkout awaiting payment
+STOCK_RESERVATION_MINUTES = config('STOCK_RESERVATION_MINUTES', default=15, cast=int)
+# Unpaid online orders older than this are cancelled by expire_pending_orders
+PENDING_ORDER_EXPIRY_HOURS = config('PENDING_ORDER_EXPIRY_HOURS', default=24, cast=int)
+
+# Idempotency-Key replay window, and how long an in-flight request keeps its key locked
+IDEMPOTENCY_KEY_TTL_HOURS = config('IDEMPOTENCY_KEY_TTL_HOURS', default=24, cast=int)
+IDEMPOTENCY_LOCK_SECONDS = config('IDEMPOTENCY_LOCK_SECONDS', default=60, cast=int)
 
 
 # Internationalization
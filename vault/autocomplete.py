@@ -0,0 +1,286 @@
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.core.cache import cache
+from django.db import connection
+
+from .models import Category, Product, ProductVariant
+
+VERSION_KEY = 'autocomplete:version'
+
+# How often a worker checks whether another process changed the catalog
+VERSION_CHECK_INTERVAL = 5
+
+MAX_SUGGESTIONS = 8
+
+COLOR_LABELS = dict(ProductVariant.COLOR_CHOICES)
+
+_WORD = re.compile(r'\w+')
+
+
+def normalize(text):
+    return ' '.join(_WORD.findall(text.lower()))
+
+
+def index_keys(label):
+    """Every word-boundary suffix of a label, so 'Omega Seamaster' is found by 'sea' as well as 'om'"""
+    words = normalize(label).split()
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+class PrefixIndex:
+    """Sorted array of (key, kind, object_id) searched with bisect.
+
+    Each searchable object owns a handful of keys; `_owned` remembers them so a
+    single object can be dropped or replaced without rebuilding the array.
+    Writers never change a published array or label map in place: they build a
+    new one and swap the reference under the lock, so readers can search a
+    snapshot without holding it.
+    """
+
+    def __init__(self):
+        self._entries = []
+        self._owned = {}
+        self._labels = {}
+        self._color_refs = {}
+        self._variant_colors = {}
+        self._lock = threading.RLock()
+        self.version = None
+        self.checked_at = 0
+        self.ready = False
+        self.loaded = False
+        self._rebuilding = False
+
+    # Building
+
+    def build(self):
+        categories = Category.objects.filter(is_deleted=False, is_blocked=False).values_list('id', 'name')
+        products = Product.objects.filter(
+            is_deleted=False, category__is_deleted=False, category__is_blocked=False
+        ).values_list('id', 'product_name')
+        variants = ProductVariant.objects.filter(
+            is_active=True, product__is_deleted=False,
+            product__category__is_deleted=False, product__category__is_blocked=False
+        ).values_list('id', 'color')
+        return self.load(
+            categories,
+            products.iterator(chunk_size=5000),
+            variants.iterator(chunk_size=5000),
+            get_index_version()
+        )
+
+    def load(self, categories, products, variants, version=None):
+        """Replace the whole index from (id, name) and (variant_id, color) rows"""
+        entries = []
+        owned = {}
+        labels = {}
+        color_refs = {}
+        variant_colors = {}
+
+        for category_id, name in categories:
+            self._collect(entries, owned, labels, ('category', category_id), name)
+        for product_id, name in products:
+            self._collect(entries, owned, labels, ('product', product_id), name)
+        for variant_id, color in variants:
+            variant_colors[variant_id] = color
+            color_refs[color] = color_refs.get(color, 0) + 1
+        for color in color_refs:
+            self._collect(entries, owned, labels, ('color', color), COLOR_LABELS.get(color, color))
+
+        entries.sort()
+        with self._lock:
+            self._entries = entries
+            self._owned = owned
+            self._labels = labels
+            self._color_refs = color_refs
+            self._variant_colors = variant_colors
+            self.version = version
+            self.checked_at = time.monotonic()
+            self.ready = True
+            self.loaded = True
+        return len(entries)
+
+    @staticmethod
+    def _collect(entries, owned, labels, ref, label):
+        keys = index_keys(label)
+        owned[ref] = keys
+        labels[ref] = label
+        entries.extend((key,) + ref for key in keys)
+
+    # Incremental maintenance
+
+    def _remove(self, ref):
+        keys = self._owned.pop(ref, ())
+        if not keys:
+            return
+        entries = list(self._entries)
+        for key in keys:
+            entry = (key,) + ref
+            i = bisect_left(entries, entry)
+            if i < len(entries) and entries[i] == entry:
+                del entries[i]
+        labels = dict(self._labels)
+        labels.pop(ref, None)
+        self._entries, self._labels = entries, labels
+
+    def _add(self, ref, label):
+        keys = index_keys(label)
+        self._owned[ref] = keys
+        entries = list(self._entries)
+        for key in keys:
+            insort(entries, (key,) + ref)
+        self._entries, self._labels = entries, {**self._labels, ref: label}
+
+    def put(self, kind, object_id, label):
+        with self._lock:
+            if not self.ready:
+                return
+            ref = (kind, object_id)
+            self._remove(ref)
+            self._add(ref, label)
+
+    def discard(self, kind, object_id):
+        with self._lock:
+            if self.ready:
+                self._remove((kind, object_id))
+
+    def put_variant(self, variant_id, color):
+        with self._lock:
+            if not self.ready:
+                return
+            self.discard_variant(variant_id)
+            self._variant_colors[variant_id] = color
+            self._color_refs[color] = self._color_refs.get(color, 0) + 1
+            if self._color_refs[color] == 1:
+                self._add(('color', color), COLOR_LABELS.get(color, color))
+
+    def discard_variant(self, variant_id):
+        with self._lock:
+            if not self.ready:
+                return
+            color = self._variant_colors.pop(variant_id, None)
+            if color is None:
+                return
+            self._color_refs[color] -= 1
+            if self._color_refs[color] <= 0:
+                del self._color_refs[color]
+                self._remove(('color', color))
+
+    def invalidate(self):
+        with self._lock:
+            self.ready = False
+
+    def mark_changed(self):
+        """Publish a local change; rebuild later if another process changed the catalog meanwhile"""
+        version = bump_index_version()
+        with self._lock:
+            if self.version is not None and version != self.version + 1:
+                self.ready = False
+            self.version = version
+
+    # Lookup
+
+    def ensure_fresh(self):
+        """Build on first use; after that a stale index keeps serving while a thread rebuilds it"""
+        if not self.loaded:
+            self.build()
+            return
+        if self.ready:
+            now = time.monotonic()
+            if now - self.checked_at < VERSION_CHECK_INTERVAL:
+                return
+            self.checked_at = now
+            if get_index_version() == self.version:
+                return
+        self.rebuild_in_background()
+
+    def rebuild_in_background(self):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild, daemon=True).start()
+
+    def _rebuild(self):
+        try:
+            self.build()
+        finally:
+            self._rebuilding = False
+            connection.close()
+
+    def suggest(self, prefix, limit=MAX_SUGGESTIONS):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        with self._lock:
+            entries, labels = self._entries, self._labels
+        seen = set()
+        results = []
+        i = bisect_left(entries, (prefix,))
+        while i < len(entries) and len(results) < limit:
+            key, kind, object_id = entries[i]
+            if not key.startswith(prefix):
+                break
+            ref = (kind, object_id)
+            if ref not in seen:
+                seen.add(ref)
+                results.append((kind, object_id, labels.get(ref, key)))
+            i += 1
+        return results
+
+
+def get_index_version():
+    return cache.get_or_set(VERSION_KEY, 1, None)
+
+
+def bump_index_version():
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2, None)
+        return 2
+
+
+index = PrefixIndex()
+
+
+def _product_visible(product):
+    category = product.category
+    return not (product.is_deleted or category.is_deleted or category.is_blocked)
+
+
+def sync_product(product, deleted=False):
+    """Apply one product save or delete to the local index, including its variant colors"""
+    visible = not deleted and _product_visible(product)
+    if visible:
+        index.put('product', product.id, product.product_name)
+    else:
+        index.discard('product', product.id)
+    if not deleted and index.ready:
+        for variant_id, color, is_active in product.variants.values_list('id', 'color', 'is_active'):
+            if visible and is_active:
+                index.put_variant(variant_id, color)
+            else:
+                index.discard_variant(variant_id)
+    index.mark_changed()
+
+
+def sync_variant(variant, deleted=False):
+    if not deleted and variant.is_active and _product_visible(variant.product):
+        index.put_variant(variant.id, variant.color)
+    else:
+        index.discard_variant(variant.id)
+    index.mark_changed()
+
+
+def sync_category(category):
+    """Blocking or renaming a category touches all of its products, so rebuild on next use"""
+    index.invalidate()
+    index.mark_changed()
+
+
+def suggest(prefix, limit=MAX_SUGGESTIONS):
+    index.ensure_fresh()
+    return index.suggest(prefix, limit)
@@ -0,0 +1,141 @@
+from django.db.models import Count, Exists, Min, Max, OuterRef, Q
+
+from .models import Product, ProductVariant
+from .search import search_products
+
+PRODUCTS_PER_PAGE = 12
+
+DEFAULT_PRICE_RANGE = {'min_price': 0, 'max_price': 10000}
+
+# (lower, upper) effective price bounds in rupees; None leaves that side open
+PRICE_BUCKETS = [
+    (None, 5000),
+    (5000, 10000),
+    (10000, 25000),
+    (25000, 50000),
+    (50000, None),
+]
+
+COLOR_LABELS = dict(ProductVariant.COLOR_CHOICES)
+
+SORT_ORDERS = {
+    'newest': ('-created_at', '-id'),
+    'oldest': ('created_at', 'id'),
+    'price_low': ('effective_price', 'id'),
+    'price_high': ('-effective_price', '-id'),
+    'name_asc': ('product_name', 'id'),
+    'name_desc': ('-product_name', '-id'),
+    'top_rated': ('-rating_average', '-rating_count', '-id'),
+    'relevance': ('-search_rank', '-name_similarity', '-id'),
+}
+
+
+def storefront_products():
+    """Products a customer is allowed to see in the catalog"""
+    return Product.objects.filter(
+        is_deleted=False,
+        category__is_deleted=False,
+        category__is_blocked=False
+    )
+
+
+def _variant_exists(**filters):
+    return Exists(ProductVariant.objects.filter(product=OuterRef('pk'), is_active=True, **filters))
+
+
+def _price_q(min_price=None, max_price=None):
+    q = Q()
+    if min_price is not None:
+        q &= Q(effective_price__gte=min_price)
+    if max_price is not None:
+        q &= Q(effective_price__lte=max_price)
+    return q
+
+
+def catalog_filters(category_id=None, min_price=None, max_price=None, color=None, in_stock=False):
+    """Active sidebar filters as {facet name: condition}"""
+    filters = {}
+    if category_id is not None:
+        filters['category'] = Q(category_id=category_id)
+    if min_price is not None or max_price is not None:
+        filters['price'] = _price_q(min_price, max_price)
+    if color:
+        filters['color'] = Q(_variant_exists(color=color))
+    if in_stock:
+        filters['in_stock'] = Q(is_in_stock=True)
+    return filters
+
+
+def catalog_queryset(query='', category_id=None, min_price=None, max_price=None, color=None, in_stock=False):
+    """Filtered storefront queryset; order it with catalog_ordering() when paginating"""
+    products = storefront_products()
+
+    if query:
+        products = search_products(products, query)
+
+    for condition in catalog_filters(category_id, min_price, max_price, color, in_stock).values():
+        products = products.filter(condition)
+
+    return products.select_related('category').prefetch_related('variants__images')
+
+
+def catalog_ordering(query, sort_by):
+    """Keyset ordering for a catalog listing; every ordering ends in id"""
+    if sort_by == 'relevance' and not query:
+        sort_by = 'newest'
+    return SORT_ORDERS.get(sort_by, SORT_ORDERS['newest'])
+
+
+def catalog_facets(query='', category_id=None, min_price=None, max_price=None, color=None, in_stock=False,
+                   category_ids=()):
+    """Result counts per category, colour, price bucket and in-stock, plus the price range, in one query.
+
+    Each facet is counted with every active filter except its own, so picking
+    another value of the same facet shows how many results it would give.
+    """
+    products = storefront_products()
+    if query:
+        products = search_products(products, query)
+    filters = catalog_filters(category_id, min_price, max_price, color, in_stock)
+
+    def narrowed(condition, facet=None):
+        for name, active in filters.items():
+            if name != facet:
+                condition &= active
+        return condition or None
+
+    def count(condition, facet=None):
+        return Count('id', distinct=True, filter=narrowed(condition, facet))
+
+    aggregates = {
+        'total': count(Q()),
+        'in_stock': count(Q(is_in_stock=True), 'in_stock'),
+        'min_price': Min('effective_price', filter=narrowed(Q())),
+        'max_price': Max('effective_price', filter=narrowed(Q())),
+    }
+    for category in category_ids:
+        aggregates[f'category_{category}'] = count(Q(category_id=category), 'category')
+    for value in COLOR_LABELS:
+        aggregates[f'color_{value}'] = count(Q(variants__is_active=True, variants__color=value), 'color')
+    for i, (low, high) in enumerate(PRICE_BUCKETS):
+        aggregates[f'price_{i}'] = count(_price_q(low, high), 'price')
+
+    row = products.order_by().aggregate(**aggregates)
+
+    price_range = {'min_price': row['min_price'], 'max_price': row['max_price']}
+    if price_range['min_price'] is None:
+        price_range = dict(DEFAULT_PRICE_RANGE)
+    return {
+        'total': row['total'],
+        'in_stock': row['in_stock'],
+        'price_range': price_range,
+        'categories': {category: row[f'category_{category}'] for category in category_ids},
+        'colors': [
+            {'value': value, 'label': label, 'count': row[f'color_{value}']}
+            for value, label in COLOR_LABELS.items()
+        ],
+        'price_buckets': [
+            {'min': low, 'max': high, 'count': row[f'price_{i}']}
+            for i, (low, high) in enumerate(PRICE_BUCKETS)
+        ],
+    }
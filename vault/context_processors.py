@@ -0,0 +1,11 @@
+from django.utils.functional import SimpleLazyObject
+
+from .nav_counts import get_nav_counts
+
+
+def nav_counts(request):
+    """Cart and wishlist badge counts, looked up only if a template uses them"""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {'nav_counts': SimpleLazyObject(lambda: get_nav_counts(user))}
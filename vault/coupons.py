@@ -0,0 +1,107 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Coupon, CouponUsage, ReferralReward
+from .offers import cached_coupon_value
+
+
+def public_coupon_candidates():
+    """(id, minimum_amount) of coupons open to everyone whose validity window is running now.
+
+    Cached until a coupon changes or the next coupon window opens or closes.
+    Only ids are cached; get_available_coupons loads the rows it needs along
+    with their live usage.
+    """
+    def build():
+        now = timezone.now()
+        return list(
+            Coupon.objects.filter(is_active=True, valid_from__lte=now, valid_until__gte=now)
+            .exclude(referralreward__isnull=False)
+            .order_by('minimum_amount', 'id').values_list('id', 'minimum_amount')
+        )
+    return cached_coupon_value('public_candidates', build)
+
+
+def _usage_subquery():
+    usage = (
+        CouponUsage.objects.filter(coupon=OuterRef('pk')).order_by()
+        .values('coupon').annotate(total=Count('pk')).values('total')
+    )
+    return Coalesce(Subquery(usage), 0, output_field=IntegerField())
+
+
+def get_available_coupons(user, cart_total):
+    """Coupons the user can apply to a cart of `cart_total`, biggest discount first.
+
+    Two queries however many coupons are running: usage counts and the user's
+    own redemptions for every eligible public coupon at once, and the user's
+    unclaimed referral coupons.
+    """
+    now = timezone.now()
+    eligible_ids = [coupon_id for coupon_id, minimum_amount in public_coupon_candidates() if minimum_amount <= cart_total]
+
+    results = []
+    if eligible_ids:
+        coupons = Coupon.objects.filter(pk__in=eligible_ids).annotate(
+            usage_count=_usage_subquery(),
+            used_by_user=Exists(CouponUsage.objects.filter(coupon=OuterRef('pk'), user=user)),
+        )
+        for coupon in coupons:
+            if coupon.used_by_user or (coupon.usage_limit and coupon.usage_count >= coupon.usage_limit):
+                continue
+            results.append({
+                'coupon': coupon,
+                'discount_amount': coupon.calculate_discount(cart_total),
+                'type': 'regular'
+            })
+
+    referral_rewards = ReferralReward.objects.filter(
+        referrer=user,
+        is_claimed=False,
+        coupon__isnull=False,
+        coupon__is_active=True,
+        coupon__valid_from__lte=now,
+        coupon__valid_until__gte=now,
+        coupon__minimum_amount__lte=cart_total
+    ).select_related('coupon').annotate(
+        used_by_user=Exists(CouponUsage.objects.filter(coupon=OuterRef('coupon'), user=user))
+    )
+    for reward in referral_rewards:
+        if reward.used_by_user:
+            continue
+        results.append({
+            'coupon': reward.coupon,
+            'discount_amount': reward.coupon.calculate_discount(cart_total),
+            'type': 'referral',
+            'referral_reward': reward
+        })
+
+    results.sort(key=lambda entry: (-entry['discount_amount'], entry['coupon'].code))
+    return results
+
+
+class _SlotTaken(Exception):
+    pass
+
+
+def redeem_coupon(coupon_id, user, order=None):
+    """Claim one use of a coupon for `user`; returns whether the use was won.
+
+    The usage row and a conditional `used_count = used_count + 1 WHERE
+    used_count < usage_limit` commit together or not at all, so concurrent
+    checkouts can never push a coupon past its limit or let a user redeem it
+    twice. Call inside the order's transaction.
+    """
+    try:
+        with transaction.atomic():
+            CouponUsage.objects.create(user=user, coupon_id=coupon_id, order=order)
+            won = Coupon.objects.filter(pk=coupon_id).filter(
+                Q(usage_limit__isnull=True) | Q(usage_limit=0) | Q(used_count__lt=F('usage_limit'))
+            ).update(used_count=F('used_count') + 1)
+            if not won:
+                raise _SlotTaken
+    except (IntegrityError, _SlotTaken):
+        return False
+    return True
@@ -0,0 +1,111 @@
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Category, Coupon, CouponUsage, Order, OrderItem, Product, User
+from .money import ZERO
+from .offers import bump_cache_version, get_cache_version
+
+DASHBOARD_VERSION_KEY = 'dashboard:version'
+DASHBOARD_TIMEOUT = 60
+
+
+def _start_of(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _order_stats(today_start, week_ago, month_ago):
+    """Every Order KPI and the status distribution from one aggregate"""
+    delivered = Q(status='delivered')
+    periods = {
+        'today': Q(created_at__gte=today_start),
+        'weekly': Q(created_at__gte=week_ago),
+        'monthly': Q(created_at__gte=month_ago),
+    }
+    aggregates = {
+        'total_orders': Count('id'),
+        'total_revenue': Sum('total_amount', filter=delivered),
+        'total_discount_given': Sum('coupon_discount', filter=delivered),
+    }
+    for name, period in periods.items():
+        aggregates[f'{name}_revenue'] = Sum('total_amount', filter=delivered & period)
+        aggregates[f'{name}_order_count'] = Count('id', filter=delivered & period)
+    for status, _ in Order.ORDER_STATUS_CHOICES:
+        aggregates[f'status_{status}'] = Count('id', filter=Q(status=status))
+
+    stats = Order.objects.aggregate(**aggregates)
+    for name in ('total_revenue', 'total_discount_given', 'today_revenue', 'weekly_revenue', 'monthly_revenue'):
+        stats[name] = stats[name] or ZERO
+    status_counts = [(status, stats.pop(f'status_{status}')) for status, _ in Order.ORDER_STATUS_CHOICES]
+    stats['order_status_counts'] = [{'status': status, 'count': count} for status, count in status_counts if count]
+    return stats
+
+
+def _daily_sales(today, days=7):
+    """Delivered revenue and order count per local day, oldest first, from one GROUP BY"""
+    first_day = today - timedelta(days=days - 1)
+    rows = {
+        row['day']: row
+        for row in Order.objects.filter(status='delivered', created_at__gte=_start_of(first_day))
+        .annotate(day=TruncDate('created_at')).values('day')
+        .annotate(revenue=Sum('total_amount'), orders=Count('id')).order_by()
+    }
+    daily_sales = []
+    for offset in range(days):
+        date = first_day + timedelta(days=offset)
+        row = rows.get(date, {})
+        daily_sales.append({
+            'date': date.strftime('%Y-%m-%d'),
+            'revenue': float(row.get('revenue') or 0),
+            'orders': row.get('orders', 0),
+        })
+    return daily_sales
+
+
+def _build_dashboard(now):
+    today = timezone.localdate(now)
+    today_start = _start_of(today)
+    month_ago = now - timedelta(days=30)
+
+    stats = _order_stats(today_start, now - timedelta(days=7), month_ago)
+    stats['daily_sales'] = _daily_sales(today)
+    stats.update(Coupon.objects.aggregate(
+        total_coupons=Count('id'),
+        active_coupons=Count('id', filter=Q(is_active=True, valid_until__gte=now)),
+    ))
+    stats['coupon_usage_today'] = CouponUsage.objects.filter(used_at__gte=today_start).count()
+    stats['total_users'] = User.objects.count()
+    stats['total_products'] = Product.objects.count()
+    stats['total_categories'] = Category.objects.count()
+    stats['recent_orders'] = list(Order.objects.select_related('user').order_by('-created_at')[:5])
+    stats['top_products'] = list(
+        OrderItem.objects.filter(order__created_at__gte=month_ago, order__status='delivered')
+        .values('product__product_name')
+        .annotate(total_quantity=Sum('quantity'), total_revenue=Sum('price'))
+        .order_by('-total_quantity')[:5]
+    )
+    return stats
+
+
+def get_dashboard_stats(now=None):
+    """The admin dashboard payload, cached for the current minute.
+
+    Order status changes invalidate it through invalidate_dashboard(); anything
+    else (new users, products, coupon use) shows up within the minute.
+    """
+    now = now or timezone.now()
+    key = f'dashboard:{get_cache_version(DASHBOARD_VERSION_KEY)}:{now:%Y%m%d%H%M}'
+    stats = cache.get(key)
+    if stats is None:
+        stats = _build_dashboard(now)
+        cache.set(key, stats, DASHBOARD_TIMEOUT)
+    return stats
+
+
+def invalidate_dashboard():
+    """Drop the cached dashboard once the current transaction commits"""
+    transaction.on_commit(lambda: bump_cache_version(DASHBOARD_VERSION_KEY))
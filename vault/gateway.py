@@ -0,0 +1,224 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+import razorpay
+import requests
+import urllib3
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+LATENCY_SAMPLES = 1000
+
+
+class GatewayError(Exception):
+    """The payment gateway call failed; the message is safe to show to the customer"""
+
+
+class GatewayUnavailable(GatewayError):
+    """Timed out, failed on the gateway's side, or short-circuited while the gateway is unhealthy"""
+
+
+class GatewayRejected(GatewayError):
+    """The gateway refused the request itself (bad amount, unknown id, ...); retrying won't help"""
+
+
+def _never_sent(error):
+    """True when the request provably never reached the gateway, so even a POST is safe to resend"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if isinstance(error, requests.ConnectionError) and error.args:
+        return isinstance(getattr(error.args[0], 'reason', None), urllib3.exceptions.NewConnectionError)
+    return False
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures and fails fast for `reset_after` seconds.
+
+    Once the cool-down has passed a single trial call is let through
+    (half-open); its outcome closes the breaker again or re-opens it.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, threshold=5, reset_after=30):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_after:
+                self.state = self.HALF_OPEN
+                self._trial_running = False
+            if self.state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Payment gateway circuit opened after {self.failures} failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class GatewayMetrics:
+    """Per-process call counters and a rolling window of latencies, per operation"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._operations = {}
+
+    def _stats(self, operation):
+        return self._operations.setdefault(operation, {
+            'calls': 0, 'errors': 0, 'rejected': 0, 'retries': 0, 'short_circuited': 0,
+            'latencies': deque(maxlen=LATENCY_SAMPLES),
+        })
+
+    def record(self, operation, latency, outcome='ok'):
+        with self._lock:
+            stats = self._stats(operation)
+            stats['calls'] += 1
+            stats['latencies'].append(latency)
+            if outcome == 'error':
+                stats['errors'] += 1
+            elif outcome == 'rejected':
+                stats['rejected'] += 1
+
+    def increment(self, operation, counter):
+        with self._lock:
+            self._stats(operation)[counter] += 1
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for operation, stats in self._operations.items():
+                latencies = sorted(stats['latencies'])
+                summary = {key: value for key, value in stats.items() if key != 'latencies'}
+                for label, fraction in (('p50_ms', 0.5), ('p95_ms', 0.95), ('p99_ms', 0.99)):
+                    summary[label] = (
+                        round(latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000, 1)
+                        if latencies else None
+                    )
+                result[operation] = summary
+            return result
+
+
+class RazorpayGateway:
+    """Razorpay client with a pooled session, connect/read timeouts, retries and a circuit breaker.
+
+    GETs are retried on timeouts and gateway errors. POSTs (creating orders)
+    are only retried when the connection was never made, since the first
+    attempt may otherwise have gone through.
+    """
+
+    def __init__(self, key_id, key_secret, base_url=None, connect_timeout=3.05, read_timeout=10,
+                 max_retries=2, backoff=0.2, pool_size=10, breaker=None, metrics=None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = metrics or GatewayMetrics()
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        options = {'base_url': base_url} if base_url else {}
+        self.client = razorpay.Client(session=session, auth=(key_id, key_secret), **options)
+
+    def _call(self, operation, func, *args, idempotent=False):
+        if not self.breaker.allow():
+            self.metrics.increment(operation, 'short_circuited')
+            raise GatewayUnavailable('Payment gateway is temporarily unavailable. Please try again shortly.')
+
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                result = func(*args, timeout=self.timeout)
+            except razorpay.errors.BadRequestError as e:
+                # The gateway answered; it is healthy even though it said no
+                self.metrics.record(operation, time.perf_counter() - started, 'rejected')
+                self.breaker.record_success()
+                raise GatewayRejected(str(e) or 'The payment gateway rejected the request.') from e
+            except (requests.RequestException, razorpay.errors.ServerError,
+                    razorpay.errors.GatewayError, ValueError) as e:
+                self.metrics.record(operation, time.perf_counter() - started, 'error')
+                retryable = idempotent or _never_sent(e)
+                if retryable and attempt < self.max_retries:
+                    attempt += 1
+                    self.metrics.increment(operation, 'retries')
+                    # Full jitter keeps a crowd of retrying workers from arriving together
+                    time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+                    continue
+                self.breaker.record_failure()
+                logger.error(f"Payment gateway {operation} failed after {attempt + 1} attempt(s): {e!r}")
+                raise GatewayUnavailable('Payment gateway is not responding. Please try again.') from e
+            self.metrics.record(operation, time.perf_counter() - started)
+            self.breaker.record_success()
+            return result
+
+    def create_order(self, amount_paise, currency='INR', receipt=None):
+        data = {'amount': amount_paise, 'currency': currency, 'payment_capture': 1}
+        if receipt:
+            data['receipt'] = receipt
+        return self._call('create_order', self.client.order.create, data)
+
+    def fetch_order(self, razorpay_order_id):
+        return self._call('fetch_order', self.client.order.fetch, razorpay_order_id, idempotent=True)
+
+    def fetch_order_payments(self, razorpay_order_id):
+        return self._call('fetch_order_payments', self.client.order.payments, razorpay_order_id, idempotent=True)
+
+    def fetch_payment(self, razorpay_payment_id):
+        return self._call('fetch_payment', self.client.payment.fetch, razorpay_payment_id, idempotent=True)
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """The process-wide gateway, or None when Razorpay keys aren't configured"""
+    global _gateway
+    if _gateway is None:
+        if not (getattr(settings, 'RAZORPAY_KEY_ID', '') and getattr(settings, 'RAZORPAY_KEY_SECRET', '')):
+            return None
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = RazorpayGateway(
+                    settings.RAZORPAY_KEY_ID,
+                    settings.RAZORPAY_KEY_SECRET,
+                    base_url=settings.RAZORPAY_BASE_URL or None,
+                    connect_timeout=settings.RAZORPAY_CONNECT_TIMEOUT,
+                    read_timeout=settings.RAZORPAY_READ_TIMEOUT,
+                    max_retries=settings.RAZORPAY_MAX_RETRIES,
+                    pool_size=settings.RAZORPAY_POOL_SIZE,
+                    breaker=CircuitBreaker(
+                        threshold=settings.RAZORPAY_BREAKER_THRESHOLD,
+                        reset_after=settings.RAZORPAY_BREAKER_RESET_SECONDS,
+                    ),
+                )
+    return _gateway
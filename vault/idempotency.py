@@ -0,0 +1,121 @@
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 64
+
+
+def request_hash(request):
+    digest = hashlib.sha256()
+    digest.update(f"{request.method} {request.path}\0".encode())
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def _claim(user, key, fingerprint):
+    """Record the key as in flight; returns (record, claimed) where claimed means this request owns it"""
+    now = timezone.now()
+    locked_until = now + timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                user=user, key=key, request_hash=fingerprint, locked_until=locked_until
+            )
+        return record, True
+    except IntegrityError:
+        pass
+
+    with transaction.atomic():
+        try:
+            record = IdempotencyKey.objects.select_for_update().get(user=user, key=key)
+        except IdempotencyKey.DoesNotExist:
+            # The first request failed and freed the key in the meantime
+            return _claim(user, key, fingerprint)
+        expired = record.created_at <= now - timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+        abandoned = record.status_code is None and record.locked_until <= now
+        if not (expired or abandoned):
+            return record, False
+        record.request_hash = fingerprint
+        record.status_code = None
+        record.response_body = None
+        record.locked_until = locked_until
+        record.created_at = now
+        record.save()
+    return record, True
+
+
+def _succeeded(response):
+    if response.status_code >= 400 or response.get('Content-Type') != 'application/json':
+        return False
+    try:
+        return json.loads(response.content).get('success') is True
+    except (ValueError, AttributeError):
+        return False
+
+
+def idempotent(view):
+    """Replay the recorded response when a client repeats a request with the same Idempotency-Key.
+
+    Only successful responses are recorded; a failed attempt frees the key so
+    the client can retry it. A duplicate that arrives while the first request
+    is still running gets a 409 instead of running the view again. Requests
+    without the header run normally.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER, '').strip()
+        if not key or not request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return JsonResponse({
+                'success': False,
+                'message': 'Invalid idempotency key.'
+            }, status=400)
+
+        fingerprint = request_hash(request)
+        record, claimed = _claim(request.user, key, fingerprint)
+        if not claimed:
+            if record.request_hash != fingerprint:
+                return JsonResponse({
+                    'success': False,
+                    'message': 'This request key was already used for a different request.'
+                }, status=422)
+            if record.status_code is None:
+                return JsonResponse({
+                    'success': False,
+                    'message': 'Your previous request is still being processed.'
+                }, status=409)
+            response = HttpResponse(record.response_body, status=record.status_code, content_type='application/json')
+            response['Idempotent-Replayed'] = 'true'
+            return response
+
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+
+        if _succeeded(response):
+            IdempotencyKey.objects.filter(pk=record.pk).update(
+                status_code=response.status_code,
+                response_body=response.content.decode(),
+                locked_until=None
+            )
+        else:
+            record.delete()
+        return response
+    return wrapper
+
+
+def purge_expired_keys(now=None):
+    cutoff = (now or timezone.now()) - timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+    return IdempotencyKey.objects.filter(created_at__lte=cutoff).delete()[0]
@@ -0,0 +1,191 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThan
+from django.utils import timezone
+
+from .models import Product, ProductVariant, StockReservation
+
+
+def _stock_crossed_zero():
+    """A product went in or out of stock: drop cached catalog values (in-stock facets) once committed"""
+    from .offers import CATALOG_VERSION_KEY, bump_cache_version  # offers -> pricing imports this module
+    transaction.on_commit(lambda: bump_cache_version(CATALOG_VERSION_KEY))
+
+
+class InsufficientStock(Exception):
+    def __init__(self, variant, requested, available=None):
+        self.variant = variant
+        self.requested = requested
+        self.available = variant.stock_quantity if available is None else available
+        super().__init__(
+            f"Only {self.available} of {variant.product.product_name} "
+            f"({variant.get_color_display()}) left in stock."
+        )
+
+
+def restock(lines):
+    """Put (variant_id, quantity) lines back in stock with one UPDATE for variants and one for products.
+
+    Variant rows and then product rows are locked in id order, as take_stock
+    does, so a restock can't deadlock with a checkout. Call inside
+    transaction.atomic(). Returns the number of variants restocked.
+    """
+    wanted = {}
+    for variant_id, quantity in lines:
+        wanted[variant_id] = wanted.get(variant_id, 0) + quantity
+    if not wanted:
+        return 0
+
+    variants = list(
+        ProductVariant.objects.select_for_update().filter(pk__in=wanted).order_by('pk')
+        .values_list('pk', 'product_id', 'is_active')
+    )
+    ProductVariant.objects.filter(pk__in=wanted).update(stock_quantity=F('stock_quantity') + Case(
+        *[When(pk=variant_id, then=Value(quantity)) for variant_id, quantity in wanted.items()],
+        default=Value(0), output_field=IntegerField(),
+    ))
+
+    # Inactive variants aren't counted in the product's summary
+    product_deltas = {}
+    for variant_id, product_id, is_active in variants:
+        if is_active:
+            product_deltas[product_id] = product_deltas.get(product_id, 0) + wanted[variant_id]
+    if product_deltas:
+        was_in_stock = list(
+            Product.objects.select_for_update().filter(pk__in=product_deltas).order_by('pk').values_list('is_in_stock', flat=True)
+        )
+        delta = Case(
+            *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in product_deltas.items()],
+            default=Value(0), output_field=IntegerField(),
+        )
+        Product.objects.filter(pk__in=product_deltas).update(
+            total_stock=F('total_stock') + delta,
+            is_in_stock=GreaterThan(F('total_stock') + delta, 0),
+        )
+        if not all(was_in_stock):
+            _stock_crossed_zero()
+    return len(variants)
+
+
+def _lock_available(lines, exclude_user=None):
+    """Lock the variants for (variant_id, quantity) lines in id order and check they can be met.
+
+    Stock held by other customers' pending checkouts counts as taken. Returns
+    (variant, quantity, held) per variant; raises InsufficientStock.
+    """
+    wanted = {}
+    for variant_id, quantity in lines:
+        wanted[variant_id] = wanted.get(variant_id, 0) + quantity
+
+    variants = list(
+        ProductVariant.objects.select_for_update(of=('self',))
+        .select_related('product', 'product__category')
+        .filter(pk__in=wanted).order_by('pk')
+    )
+    if len(variants) != len(wanted):
+        raise ProductVariant.DoesNotExist("A variant in the order no longer exists")
+
+    held = dict(
+        StockReservation.active(exclude_user).filter(variant__in=wanted).order_by()
+        .values('variant').annotate(total=Sum('quantity')).values_list('variant', 'total')
+    )
+    locked = []
+    for variant in variants:
+        quantity = wanted[variant.pk]
+        product = variant.product
+        if not variant.is_active or product.is_deleted or product.category.is_deleted:
+            raise InsufficientStock(variant, quantity, available=0)
+        variant_held = held.get(variant.pk, 0)
+        if variant.stock_quantity - variant_held < quantity:
+            raise InsufficientStock(variant, quantity, available=max(variant.stock_quantity - variant_held, 0))
+        locked.append((variant, quantity, variant_held))
+    return locked
+
+
+def take_stock(lines, exclude_user=None):
+    """Decrement stock for (variant_id, quantity) lines atomically; call inside transaction.atomic().
+
+    Variant rows are locked in id order and product rows updated in id order so
+    concurrent checkouts queue behind each other instead of deadlocking. Holds
+    belonging to `exclude_user` (the buyer) don't count against them. Raises
+    InsufficientStock, leaving the caller to roll back, when any line can't be met.
+    """
+    locked = _lock_available(lines, exclude_user)
+
+    product_deltas = {}
+    for variant, quantity, held in locked:
+        updated = ProductVariant.objects.filter(pk=variant.pk, stock_quantity__gte=quantity + held).update(
+            stock_quantity=F('stock_quantity') - quantity
+        )
+        if not updated:
+            raise InsufficientStock(variant, quantity)
+        product_deltas[variant.product_id] = product_deltas.get(variant.product_id, 0) + quantity
+
+    for product_id in sorted(product_deltas):
+        delta = product_deltas[product_id]
+        Product.objects.filter(pk=product_id).update(
+            total_stock=F('total_stock') - delta,
+            is_in_stock=GreaterThan(F('total_stock') - delta, 0),
+        )
+    # Every product here was in stock before, so any out of stock now just sold out
+    if Product.objects.filter(pk__in=product_deltas, is_in_stock=False).exists():
+        _stock_crossed_zero()
+    return [variant for variant, _, _ in locked]
+
+
+def reserve_stock(order, lines):
+    """Hold stock for a pending online order until it is paid or the hold expires.
+
+    Call inside transaction.atomic(). Any earlier holds of the same order are
+    replaced. Raises InsufficientStock when the stock is already taken or held.
+    """
+    StockReservation.objects.filter(order=order).delete()
+    locked = _lock_available(lines, exclude_user=order.user_id)
+    expires_at = timezone.now() + timedelta(minutes=settings.STOCK_RESERVATION_MINUTES)
+    return StockReservation.objects.bulk_create([
+        StockReservation(order=order, variant=variant, quantity=quantity, expires_at=expires_at)
+        for variant, quantity, _ in locked
+    ])
+
+
+def with_held_stock(cart_items, user):
+    """Annotate cart items with what other customers hold, so is_available() needs no extra queries"""
+    return cart_items.annotate(
+        held_stock=StockReservation.held_subquery(OuterRef('variant'), exclude_user=user.pk)
+    )
+
+
+def release_reservations(orders):
+    return StockReservation.objects.filter(order__in=orders).delete()[0]
+
+
+def release_expired_reservations(now=None):
+    """Delete every hold that has run out, in one statement"""
+    return StockReservation.objects.filter(expires_at__lte=now or timezone.now()).delete()[0]
+
+
+def set_stock(variant, quantity):
+    """Overwrite a variant's stock (admin correction) and recompute its product's summary"""
+    ProductVariant.objects.filter(pk=variant.pk).update(stock_quantity=quantity)
+    variant.stock_quantity = quantity
+    refresh_stock_summaries(Product.objects.filter(pk=variant.product_id))
+    _stock_crossed_zero()
+
+
+def refresh_stock_summaries(products=None):
+    """Recompute total_stock and is_in_stock from active variants with one UPDATE"""
+    if products is None:
+        products = Product.objects.all()
+    active_stock = Subquery(
+        ProductVariant.objects.filter(product=OuterRef('pk'), is_active=True)
+        .order_by().values('product').annotate(total=Sum('stock_quantity')).values('total')
+    )
+    total = Coalesce(active_stock, 0, output_field=IntegerField())
+    return products.order_by().update(
+        total_stock=total,
+        is_in_stock=GreaterThan(total, 0),
+    )
@@ -0,0 +1,74 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+
+from vault import autocomplete
+from vault.models import ProductVariant, User
+from vault.views import product_suggestions
+
+BRANDS = [
+    'Omega', 'Rolex', 'Seiko', 'Citizen', 'Tissot', 'Longines', 'Breitling', 'Tag Heuer', 'Cartier',
+    'Hamilton', 'Oris', 'Casio', 'Orient', 'Zenith', 'Panerai', 'Chopard', 'Bulova', 'Fossil',
+]
+MODELS = [
+    'Seamaster', 'Speedmaster', 'Submariner', 'Datejust', 'Presage', 'Prospex', 'Navigator', 'Aquaracer',
+    'Carrera', 'Khaki', 'Aquis', 'Chronomat', 'Santos', 'Tank', 'Luminor', 'Pilot', 'Diver', 'Explorer',
+]
+EDITIONS = ['Chronograph', 'Automatic', 'GMT', 'Heritage', 'Classic', 'Sport', 'Limited', 'Skeleton', 'Moonphase']
+
+
+class Command(BaseCommand):
+    help = "Measure autocomplete latency against a synthetic in-memory catalog"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=50000)
+        parser.add_argument('--requests', type=int, default=20000)
+        parser.add_argument('--budget-ms', type=float, default=5.0, help="Fail if p99 exceeds this")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        count = options['products']
+        colors = [value for value, _ in ProductVariant.COLOR_CHOICES]
+
+        names = [
+            f"{rng.choice(BRANDS)} {rng.choice(MODELS)} {rng.choice(EDITIONS)} {rng.randint(100, 9999)}"
+            for _ in range(count)
+        ]
+        categories = [(i, f"{brand} Collection") for i, brand in enumerate(BRANDS, start=1)]
+        variants = [(i, rng.choice(colors)) for i in range(1, count * 2 + 1)]
+
+        started = time.perf_counter()
+        entries = autocomplete.index.load(
+            categories, enumerate(names, start=1), variants, autocomplete.get_index_version()
+        )
+        build_ms = (time.perf_counter() - started) * 1000
+        self.stdout.write(f"Indexed {count} products ({entries} keys) in {build_ms:.0f} ms")
+
+        # Prefixes people actually type: the first few letters of a brand, model or edition
+        vocabulary = [word.lower() for word in BRANDS + MODELS + EDITIONS + ['Gold', 'Black', 'Rose']]
+        prefixes = [rng.choice(vocabulary)[:rng.randint(1, 6)] for _ in range(options['requests'])]
+
+        factory = RequestFactory()
+        shopper = User(email='benchmark@example.com')  # unsaved, only has to pass login_required
+        timings = []
+        for prefix in prefixes:
+            request = factory.get('/products/suggest/', {'q': prefix})
+            request.user = shopper
+            started = time.perf_counter()
+            product_suggestions(request)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        timings.sort()
+        p50 = timings[len(timings) // 2]
+        p99 = timings[int(len(timings) * 0.99) - 1]
+        self.stdout.write(
+            f"{len(timings)} requests: p50 {p50:.3f} ms, p99 {p99:.3f} ms, max {timings[-1]:.3f} ms"
+        )
+        autocomplete.index.invalidate()
+
+        if p99 > options['budget_ms']:
+            raise CommandError(f"p99 {p99:.3f} ms is over the {options['budget_ms']} ms budget")
+        self.stdout.write(self.style.SUCCESS(f"p99 is within the {options['budget_ms']} ms budget"))
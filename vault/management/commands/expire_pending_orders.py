@@ -0,0 +1,27 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from vault.orders import expire_abandoned_orders
+
+
+class Command(BaseCommand):
+    help = "Cancel online orders that were never paid for; safe to run on several nodes at once"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-hours', type=int, default=settings.PENDING_ORDER_EXPIRY_HOURS)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--loop', action='store_true', help="Keep sweeping every --interval seconds")
+        parser.add_argument('--interval', type=int, default=300)
+
+    def handle(self, *args, **options):
+        older_than = timedelta(hours=options['older_than_hours'])
+        while True:
+            expired = expire_abandoned_orders(older_than, batch_size=options['batch_size'])
+            if expired or not options['loop']:
+                self.stdout.write(f"Expired {expired} unpaid online orders")
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
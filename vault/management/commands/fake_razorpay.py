@@ -0,0 +1,173 @@
+import hashlib
+import hmac
+import json
+import random
+import re
+import secrets
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+
+class FakeRazorpay:
+    """In-memory stand-in for the parts of the Razorpay Orders/Payments API the shop uses"""
+
+    def __init__(self, latency=0.0, failure_rate=0.0, hang_rate=0.0, hang_seconds=30,
+                 webhook_url=None, webhook_secret=''):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.webhook_url = webhook_url
+        self.webhook_secret = webhook_secret
+        self.orders = {}
+        self.payments = {}
+        self.lock = threading.Lock()
+
+    def create_order(self, data):
+        order = {
+            'id': f"order_{secrets.token_hex(7)}",
+            'entity': 'order',
+            'amount': int(data.get('amount', 0)),
+            'amount_paid': 0,
+            'currency': data.get('currency', 'INR'),
+            'receipt': data.get('receipt'),
+            'status': 'created',
+            'attempts': 0,
+            'created_at': int(time.time()),
+        }
+        if order['amount'] < 100:
+            return 400, {'error': {'code': 'BAD_REQUEST_ERROR', 'description': 'Order amount less than minimum amount allowed'}}
+        with self.lock:
+            self.orders[order['id']] = order
+        return 200, order
+
+    def capture(self, order_id):
+        """Simulate the customer paying an order; returns the payment"""
+        with self.lock:
+            order = self.orders[order_id]
+            payment = {
+                'id': f"pay_{secrets.token_hex(7)}",
+                'entity': 'payment',
+                'amount': order['amount'],
+                'currency': order['currency'],
+                'status': 'captured',
+                'order_id': order_id,
+                'method': 'upi',
+                'created_at': int(time.time()),
+            }
+            self.payments[payment['id']] = payment
+            order.update(status='paid', amount_paid=order['amount'], attempts=order['attempts'] + 1)
+        if self.webhook_url:
+            threading.Thread(target=self.send_webhook, args=('payment.captured', payment), daemon=True).start()
+        return payment
+
+    def send_webhook(self, event, payment):
+        body = json.dumps({
+            'entity': 'event',
+            'event': event,
+            'payload': {'payment': {'entity': payment}},
+            'created_at': int(time.time()),
+        }).encode()
+        request = urllib.request.Request(self.webhook_url, data=body, method='POST', headers={
+            'Content-Type': 'application/json',
+            'X-Razorpay-Event-Id': f"evt_{secrets.token_hex(7)}",
+            'X-Razorpay-Signature': hmac.new(self.webhook_secret.encode(), body, hashlib.sha256).hexdigest(),
+        })
+        try:
+            urllib.request.urlopen(request, timeout=10).close()
+        except OSError as e:
+            print(f"Webhook delivery to {self.webhook_url} failed: {e}")
+
+    def route(self, method, path, body):
+        if method == 'POST' and path == '/v1/orders':
+            return self.create_order(body)
+        if method == 'POST' and (match := re.fullmatch(r'/v1/orders/([\w]+)/pay', path)):
+            if match.group(1) not in self.orders:
+                return 404, {'error': {'code': 'BAD_REQUEST_ERROR', 'description': 'The id provided does not exist'}}
+            return 200, self.capture(match.group(1))
+        if method == 'GET' and (match := re.fullmatch(r'/v1/orders/([\w]+)/payments', path)):
+            items = [p for p in self.payments.values() if p['order_id'] == match.group(1)]
+            return 200, {'entity': 'collection', 'count': len(items), 'items': items}
+        if method == 'GET' and (match := re.fullmatch(r'/v1/(orders|payments)/([\w]+)', path)):
+            store = self.orders if match.group(1) == 'orders' else self.payments
+            if match.group(2) in store:
+                return 200, store[match.group(2)]
+            return 400, {'error': {'code': 'BAD_REQUEST_ERROR', 'description': 'The id provided does not exist'}}
+        return 404, {'error': {'code': 'BAD_REQUEST_ERROR', 'description': 'The requested URL was not found on the server.'}}
+
+
+def make_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _respond(self, method):
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length) if length else b''
+            try:
+                body = json.loads(raw) if raw else {}
+            except ValueError:
+                body = {}
+
+            if fake.latency:
+                time.sleep(fake.latency)
+            roll = random.random()
+            if roll < fake.hang_rate:
+                time.sleep(fake.hang_seconds)
+            if roll < fake.hang_rate + fake.failure_rate:
+                status, payload = 500, {'error': {'code': 'SERVER_ERROR', 'description': 'The server encountered an error.'}}
+            else:
+                status, payload = fake.route(method, self.path.split('?')[0], body)
+
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._respond('GET')
+
+        def do_POST(self):
+            self._respond('POST')
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+class Command(BaseCommand):
+    help = "Run a local fake Razorpay API (set RAZORPAY_BASE_URL to its address) for offline testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency-ms', type=float, default=0, help="Delay added to every response")
+        parser.add_argument('--failure-rate', type=float, default=0, help="Share of requests answered with a 500")
+        parser.add_argument('--hang-rate', type=float, default=0,
+                            help="Share of requests that stall for --hang-seconds (to exercise timeouts)")
+        parser.add_argument('--hang-seconds', type=float, default=30)
+        parser.add_argument('--webhook-url', help="POST a signed payment.captured event here when an order is paid")
+        parser.add_argument('--webhook-secret', default='', help="Secret used to sign webhook deliveries")
+
+    def handle(self, *args, **options):
+        fake = FakeRazorpay(
+            latency=options['latency_ms'] / 1000,
+            failure_rate=options['failure_rate'],
+            hang_rate=options['hang_rate'],
+            hang_seconds=options['hang_seconds'],
+            webhook_url=options['webhook_url'],
+            webhook_secret=options['webhook_secret'],
+        )
+        server = ThreadingHTTPServer(('127.0.0.1', options['port']), make_handler(fake))
+        self.stdout.write(f"Fake Razorpay listening on http://127.0.0.1:{options['port']} (Ctrl+C to stop)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from vault.payment_events import process_pending_events
+
+
+class Command(BaseCommand):
+    help = "Settle orders from stored Razorpay webhook events"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep polling for new events")
+        parser.add_argument('--interval', type=float, default=2, help="Seconds to wait when the queue is empty")
+        parser.add_argument('--batch-size', type=int, default=50)
+
+    def handle(self, *args, **options):
+        while True:
+            events = process_pending_events(options['batch_size'])
+            for event in events:
+                self.stdout.write(f"{event.event_type} {event.event_id}: {event.status} - {event.note}")
+            if not options['loop']:
+                return
+            if not events:
+                time.sleep(options['interval'])
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from vault.models import Product
+from vault.ratings import rebuild_rating_summaries
+
+
+class Command(BaseCommand):
+    help = "Recompute every product's stored review count, sum, average and star histogram from ProductReview"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product', type=int, help="Only rebuild this product id")
+
+    def handle(self, *args, **options):
+        products = Product.objects.all()
+        if options['product']:
+            products = products.filter(pk=options['product'])
+        updated = rebuild_rating_summaries(products)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating summaries for {updated} products"))
@@ -0,0 +1,76 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from vault.gateway import GatewayError, get_gateway
+from vault.models import Order
+from vault.orders import EXPIRED_REASON
+from vault.payment_events import settle_payment
+
+
+class Command(BaseCommand):
+    help = "Settle pending (and recently expired) online orders against Razorpay, for payments whose callback never arrived"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=15,
+                            help="Only orders created at least this many minutes ago (leave live checkouts alone)")
+        parser.add_argument('--expired-within', type=int, default=72,
+                            help="Also check orders that expired unpaid in the last this many hours, for late captures")
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--workers', type=int, default=4, help="Parallel gateway lookups per batch")
+
+    def handle(self, *args, **options):
+        gateway = get_gateway()
+        if gateway is None:
+            raise CommandError("Razorpay is not configured")
+
+        cutoff = timezone.now() - timedelta(minutes=options['older_than'])
+        expired_since = timezone.now() - timedelta(hours=options['expired_within'])
+        pending = Order.objects.filter(
+            Q(status='pending') | Q(
+                status='cancelled', cancellation_reason=EXPIRED_REASON,
+                razorpay_payment_id__isnull=True, updated_at__gte=expired_since,
+            ),
+            payment_method='online', razorpay_order_id__isnull=False, created_at__lte=cutoff
+        ).order_by('id')
+
+        def lookup(order):
+            try:
+                return order, gateway.fetch_order_payments(order.razorpay_order_id), None
+            except GatewayError as e:
+                return order, None, e
+            finally:
+                close_old_connections()
+
+        totals = {'checked': 0, 'settled': 0, 'unpaid': 0, 'errors': 0}
+        last_id = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                batch = list(pending.filter(id__gt=last_id).only('id', 'order_number', 'razorpay_order_id')[:options['batch_size']])
+                if not batch:
+                    break
+                last_id = batch[-1].id
+
+                for order, payments, error in pool.map(lookup, batch):
+                    totals['checked'] += 1
+                    if error is not None:
+                        totals['errors'] += 1
+                        self.stderr.write(f"{order.order_number}: {error}")
+                        continue
+                    captured = [p for p in payments.get('items', []) if p.get('status') == 'captured']
+                    if not captured:
+                        totals['unpaid'] += 1
+                        continue
+                    with transaction.atomic():
+                        status, note = settle_payment(captured[0])
+                    totals['settled'] += status == 'processed'
+                    self.stdout.write(f"{order.order_number}: {note}")
+
+        self.stdout.write(
+            f"Checked {totals['checked']} pending orders: {totals['settled']} settled, "
+            f"{totals['unpaid']} still unpaid, {totals['errors']} lookup errors"
+        )
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from vault.models import Product
+from vault.pricing import refresh_effective_prices
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored best-offer price of every product (or of one category)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--category', type=int, help="Only reprice products of this category id")
+
+    def handle(self, *args, **options):
+        products = Product.objects.all()
+        if options['category']:
+            products = products.filter(category_id=options['category'])
+        updated = refresh_effective_prices(products)
+        self.stdout.write(self.style.SUCCESS(f"Repriced {updated} products"))
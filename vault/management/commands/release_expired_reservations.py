@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from vault.inventory import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = "Release stock held by online checkouts whose payment window has expired"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep sweeping every --interval seconds")
+        parser.add_argument('--interval', type=int, default=60)
+
+    def handle(self, *args, **options):
+        while True:
+            released = release_expired_reservations()
+            if released or not options['loop']:
+                self.stdout.write(f"Released {released} expired stock reservations")
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from vault.offers import OfferTimeline, apply_transitions, invalidate_offer_caches
+from vault.pricing import refresh_effective_prices
+
+
+class Command(BaseCommand):
+    help = "Apply category offer and coupon window openings/closings as they happen"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep running and wait for the next transition")
+        parser.add_argument('--max-sleep', type=int, default=60,
+                            help="Longest wait in seconds before reloading the timeline (picks up new offers)")
+
+    def handle(self, *args, **options):
+        # Catch up on anything that changed while the scheduler was not running
+        checked_at = timezone.now()
+        repriced = refresh_effective_prices(now=checked_at)
+        invalidate_offer_caches()
+        self.stdout.write(f"Repriced {repriced} products")
+
+        if not options['loop']:
+            return
+
+        timeline = OfferTimeline()
+        timeline.load(checked_at)
+        while True:
+            next_at = timeline.next_at()
+            wait = options['max_sleep']
+            if next_at is not None:
+                wait = min(wait, max(0, (next_at - timezone.now()).total_seconds()))
+            time.sleep(wait)
+
+            checked_at = timezone.now()
+            due = timeline.pop_due(checked_at)
+            if due:
+                repriced = apply_transitions(due)
+                for transition in due:
+                    self.stdout.write(f"{transition.at:%Y-%m-%d %H:%M:%S} {transition.kind} #{transition.object_id}")
+                self.stdout.write(f"Repriced {repriced} products")
+
+            if timeline.next_at() is None or (checked_at - timeline.loaded_at).total_seconds() >= options['max_sleep']:
+                timeline.load(checked_at)
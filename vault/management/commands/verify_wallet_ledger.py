@@ -0,0 +1,49 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from vault.models import Wallet, WalletTransaction
+
+
+class Command(BaseCommand):
+    help = "Recompute every wallet balance from its ledger and report wallets that disagree"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        entries = WalletTransaction.objects.filter(wallet=OuterRef('pk')).order_by()
+        signed = Case(When(transaction_type='credit', then=F('amount')), default=-F('amount'))
+        money = DecimalField(max_digits=12, decimal_places=2)
+        wallets = Wallet.objects.annotate(
+            ledger_total=Coalesce(
+                Subquery(entries.values('wallet').annotate(total=Sum(signed)).values('total'), output_field=money),
+                Value(Decimal('0.00')), output_field=money
+            ),
+            last_balance=Subquery(entries.order_by('-id').values('balance_after')[:1]),
+        ).select_related('user').order_by('id')
+
+        checked = 0
+        mismatches = []
+        last_id = 0
+        while True:
+            chunk = list(wallets.filter(id__gt=last_id)[:options['chunk_size']])
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+            checked += len(chunk)
+            for wallet in chunk:
+                if wallet.ledger_total != wallet.balance or (
+                    wallet.last_balance is not None and wallet.last_balance != wallet.balance
+                ):
+                    mismatches.append(wallet)
+                    self.stderr.write(
+                        f"{wallet.user.email}: balance ₹{wallet.balance}, ledger ₹{wallet.ledger_total}, "
+                        f"last entry ₹{wallet.last_balance}"
+                    )
+
+        self.stdout.write(f"Checked {checked} wallets, {len(mismatches)} mismatched")
+        if mismatches:
+            raise CommandError(f"{len(mismatches)} wallets don't match their ledger")
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.3 on 2026-10-16 22:43
+
+import django.db.models.deletion
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def populate_effective_price(apps, schema_editor):
+    Product = apps.get_model('vault', 'Product')
+    CategoryOffer = apps.get_model('vault', 'CategoryOffer')
+    now = timezone.now()
+    cent = Decimal('0.01')
+
+    best_offers = {}
+    running_offers = CategoryOffer.objects.filter(
+        is_active=True, valid_from__lte=now, valid_until__gte=now
+    ).order_by('category_id', '-discount_percentage', '-created_at')
+    for offer in running_offers:
+        best_offers.setdefault(offer.category_id, offer)
+
+    products = list(Product.objects.all())
+    for product in products:
+        offer = best_offers.get(product.category_id)
+        category_percentage = float(offer.discount_percentage) if offer else 0.0
+        product_percentage = float(product.product_offer or 0)
+        if product_percentage > category_percentage:
+            product.offer_source, product.applied_category_offer = 'product', None
+        elif category_percentage > 0:
+            product.offer_source, product.applied_category_offer = 'category', offer
+        else:
+            product.offer_source, product.applied_category_offer = 'none', None
+        product.applied_offer = max(product_percentage, category_percentage)
+        percentage = Decimal(str(product.applied_offer)).quantize(cent, rounding=ROUND_HALF_UP)
+        product.effective_price = (Decimal(product.price) * (100 - percentage) / 100).quantize(cent, rounding=ROUND_HALF_UP)
+
+    Product.objects.bulk_update(
+        products,
+        ['effective_price', 'applied_offer', 'offer_source', 'applied_category_offer'],
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vault', '0040_alter_order_order_number'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='applied_category_offer',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='vault.categoryoffer'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='applied_offer',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='offer_source',
+            field=models.CharField(choices=[('none', 'No Offer'), ('product', 'Product Offer'), ('category', 'Category Offer')], default='none', max_length=10),
+        ),
+        migrations.RunPython(populate_effective_price, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def add_variant_colors(apps, schema_editor):
+    Product = apps.get_model('vault', 'Product')
+    Category = apps.get_model('vault', 'Category')
+    ProductVariant = apps.get_model('vault', 'ProductVariant')
+    category_name = Subquery(Category.objects.filter(pk=OuterRef('category_id')).values('name')[:1])
+    colors = Subquery(
+        ProductVariant.objects.filter(product=OuterRef('pk'), is_active=True)
+        .values('product').annotate(colors=StringAgg('color', ' ')).values('colors')
+    )
+    Product.objects.update(search_vector=(
+        SearchVector('product_name', weight='A', config='english') +
+        SearchVector(category_name, weight='B', config='english') +
+        SearchVector('product_description', weight='C', config='english') +
+        SearchVector(colors, weight='D', config='english')
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vault', '0042_product_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_variant_colors, migrations.RunPython.noop),
+    ]
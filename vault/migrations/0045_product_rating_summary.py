@@ -0,0 +1,79 @@
+# Generated by Django 5.2.3 on 2026-10-16 22:56
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def populate_rating_summary(apps, schema_editor):
+    Product = apps.get_model('vault', 'Product')
+    ProductReview = apps.get_model('vault', 'ProductReview')
+    totals = {}
+    for product_id, rating, count in (
+        ProductReview.objects.values_list('product_id', 'rating').annotate(n=models.Count('id')).order_by()
+    ):
+        totals.setdefault(product_id, {})[rating] = count
+
+    products = list(Product.objects.filter(pk__in=totals))
+    for product in products:
+        histogram = totals[product.pk]
+        product.rating_count = sum(histogram.values())
+        product.rating_sum = sum(rating * count for rating, count in histogram.items())
+        product.rating_average = round(Decimal(product.rating_sum) / product.rating_count, 2)
+        for stars in range(1, 6):
+            setattr(product, f'rating_{stars}_count', histogram.get(stars, 0))
+    Product.objects.bulk_update(products, [
+        'rating_count', 'rating_sum', 'rating_average',
+        'rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count',
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vault', '0044_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_average',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, editable=False, max_digits=3),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_rating_summary, migrations.RunPython.noop),
+    ]
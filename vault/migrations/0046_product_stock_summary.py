@@ -0,0 +1,38 @@
+# Generated by Django 5.2.3 on 2026-10-16 22:57
+
+from django.db import migrations, models
+
+
+def populate_stock_summary(apps, schema_editor):
+    Product = apps.get_model('vault', 'Product')
+    ProductVariant = apps.get_model('vault', 'ProductVariant')
+    totals = dict(
+        ProductVariant.objects.filter(is_active=True).order_by()
+        .values_list('product_id').annotate(total=models.Sum('stock_quantity'))
+    )
+    products = list(Product.objects.all())
+    for product in products:
+        product.total_stock = totals.get(product.pk) or 0
+        product.is_in_stock = product.total_stock > 0
+    Product.objects.bulk_update(products, ['total_stock', 'is_in_stock'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vault', '0045_product_rating_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='is_in_stock',
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='total_stock',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_stock_summary, migrations.RunPython.noop),
+    ]
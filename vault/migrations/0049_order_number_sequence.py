@@ -0,0 +1,15 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vault', '0048_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE SEQUENCE IF NOT EXISTS vault_order_number_seq",
+            reverse_sql="DROP SEQUENCE IF EXISTS vault_order_number_seq",
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.3 on 2026-10-16 23:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vault', '0050_payment_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='cancellation_reason',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('payment_method', 'online'), ('status', 'pending')), fields=['created_at', 'id'], name='order_pending_online_idx'),
+        ),
+    ]
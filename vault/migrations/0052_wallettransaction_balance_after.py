@@ -0,0 +1,35 @@
+# Generated by Django 5.2.3 on 2026-10-16 23:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vault', '0051_order_cancellation_reason'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wallettransaction',
+            name='balance_after',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='wallettransaction',
+            index=models.Index(fields=['wallet', 'id'], name='wallettxn_wallet_id_idx'),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE vault_wallettransaction AS t
+            SET balance_after = running.balance
+            FROM (
+                SELECT id, SUM(CASE WHEN transaction_type = 'credit' THEN amount ELSE -amount END)
+                    OVER (PARTITION BY wallet_id ORDER BY id) AS balance
+                FROM vault_wallettransaction
+            ) AS running
+            WHERE running.id = t.id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
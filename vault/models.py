@@ -1,4 +1,7 @@
 from django.db import models
+from django.db.models.functions import Coalesce
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.core.exceptions import ValidationError
 from django.utils import timezone
@@ -47,6 +50,11 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['full_name']
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='user_created_id_idx'),
+        ]
+
     def __str__(self):
         return self.email
 
@@ -116,7 +124,7 @@ class Category(models.Model):
             is_active=True,
             valid_from__lte=now,
             valid_until__gte=now
-        ).first()
+        ).order_by('-discount_percentage', '-created_at').first()
 
     def get_offer_percentage(self):
         """Get current offer percentage for this category"""
@@ -163,9 +171,84 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Best-offer pricing, stored so listings can filter and sort on it
+    OFFER_SOURCES = [
+        ('none', 'No Offer'),
+        ('product', 'Product Offer'),
+        ('category', 'Category Offer'),
+    ]
+    PRICING_FIELDS = ['effective_price', 'applied_offer', 'offer_source', 'applied_category_offer']
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, db_index=True)
+    applied_offer = models.FloatField(default=0.0)
+    offer_source = models.CharField(max_length=10, choices=OFFER_SOURCES, default='none')
+    applied_category_offer = models.ForeignKey(CategoryOffer, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    # Full-text document, kept up to date by vault.search.refresh_search_vectors
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    # Review summary, maintained with F() updates by vault.ratings
+    RATING_FIELDS = [
+        'rating_count', 'rating_sum', 'rating_average',
+        'rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count',
+    ]
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_average = models.DecimalField(max_digits=3, decimal_places=2, default=0, editable=False, db_index=True)
+    rating_1_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_2_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_3_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_4_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_5_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # Stock of active variants, maintained with F() updates by vault.inventory
+    STOCK_FIELDS = ['total_stock', 'is_in_stock']
+    total_stock = models.IntegerField(default=0, editable=False)
+    is_in_stock = models.BooleanField(default=False, editable=False, db_index=True)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='product_search_vector_gin'),
+            GinIndex(fields=['product_name'], name='product_name_trgm_gin', opclasses=['gin_trgm_ops']),
+            models.Index(fields=['created_at', 'id'], name='product_created_id_idx'),
+            models.Index(fields=['effective_price', 'id'], name='product_price_id_idx'),
+        ]
+
     def __str__(self):
         return self.product_name
 
+    def save(self, *args, **kwargs):
+        self.apply_best_offer()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | set(self.PRICING_FIELDS)
+        elif not self._state.adding and not kwargs.get('force_insert'):
+            # Never write back counters that other requests update in place
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.RATING_FIELDS + self.STOCK_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    def apply_best_offer(self):
+        """Fill the stored pricing fields from the product offer and the running category offer"""
+        from .money import apply_percentage
+        category_offer = self.category.get_active_offer()
+        category_percentage = float(category_offer.discount_percentage) if category_offer else 0.0
+        product_percentage = float(self.product_offer or 0)
+
+        if product_percentage > category_percentage:
+            self.offer_source = 'product'
+            self.applied_category_offer = None
+        elif category_percentage > 0:
+            self.offer_source = 'category'
+            self.applied_category_offer = category_offer
+        else:
+            self.offer_source = 'none'
+            self.applied_category_offer = None
+
+        self.applied_offer = max(product_percentage, category_percentage)
+        self.effective_price = apply_percentage(self.price, self.applied_offer)
+
     def get_main_image(self):
         if self.main_image:
             return self.main_image
@@ -180,65 +263,58 @@ class Product(models.Model):
         return self.variants.count()
 
     def get_average_rating(self):
-        from django.db.models import Avg
-        avg_rating = self.reviews.aggregate(Avg('rating'))['rating__avg']
-        return round(avg_rating, 1) if avg_rating else 0
+        return round(float(self.rating_average), 1) if self.rating_count else 0
 
     def get_total_reviews(self):
-        return self.reviews.count()
+        return self.rating_count
 
     def get_rating_distribution(self):
-        from django.db.models import Count
-        distribution = {}
-        for i in range(1, 6):
-            count = self.reviews.filter(rating=i).count()
-            distribution[i] = count
-        return distribution
+        return {i: getattr(self, f'rating_{i}_count') for i in range(1, 6)}
+
+    def get_rating_stats(self):
+        """Average, total and per-star counts from the stored review summary"""
+        return {
+            'average': self.get_average_rating(),
+            'total': self.rating_count,
+            'distribution': self.get_rating_distribution(),
+        }
 
     def get_total_stock(self):
-        return sum(variant.stock_quantity for variant in self.variants.all())
+        return self.total_stock
+
+    def get_available_stock(self):
+        """Total stock less units held by pending checkouts"""
+        held = StockReservation.held_for(variant__product=self, variant__is_active=True)
+        return max(self.total_stock - held, 0)
 
     def is_available(self):
-        return not self.is_deleted and self.get_total_stock() > 0
+        return not self.is_deleted and self.is_in_stock
 
     def get_best_offer_percentage(self):
         """Get the best offer percentage between product and category offers"""
-        product_offer = self.product_offer
-        category_offer = self.category.get_offer_percentage()
-        return max(float(product_offer), float(category_offer))
+        return self.applied_offer
 
     def get_discounted_price(self):
-        """Calculate discounted price using the best available offer"""
-        best_offer = self.get_best_offer_percentage()
-        if best_offer > 0:
-            discount_amount = (self.price * best_offer) / 100
-            return self.price - discount_amount
-        return self.price
+        """Price after the best available offer"""
+        return self.effective_price
+
+    def get_savings(self):
+        return self.price - self.effective_price
 
     def get_offer_details(self):
         """Get details about which offer is being applied"""
-        product_offer = self.product_offer
-        category_offer = self.category.get_offer_percentage()
-        
-        if product_offer > category_offer:
-            return {
-                'type': 'product',
-                'percentage': product_offer,
-                'source': 'Product Offer'
-            }
-        elif category_offer > 0:
-            category_offer_obj = self.category.get_active_offer()
-            return {
-                'type': 'category',
-                'percentage': category_offer,
-                'source': f'Category Offer: {category_offer_obj.offer_name}' if category_offer_obj else 'Category Offer'
-            }
+        if self.offer_source == 'product':
+            source = 'Product Offer'
+        elif self.offer_source == 'category':
+            category_offer = self.applied_category_offer
+            source = f'Category Offer: {category_offer.offer_name}' if category_offer else 'Category Offer'
         else:
-            return {
-                'type': 'none',
-                'percentage': 0,
-                'source': 'No Offer'
-            }
+            source = 'No Offer'
+        return {
+            'type': self.offer_source,
+            'percentage': self.applied_offer,
+            'source': source
+        }
 
 class ProductVariant(models.Model):
     COLOR_CHOICES = [
@@ -278,6 +354,16 @@ class ProductVariant(models.Model):
     def is_in_stock(self):
         return self.stock_quantity > 0
 
+    def get_held_stock(self, exclude_user=None):
+        """Units held by pending checkouts (uses a `held_stock` annotation when present)"""
+        held = getattr(self, 'held_stock', None)
+        if held is None:
+            held = StockReservation.held_for(exclude_user, variant=self)
+        return held
+
+    def get_available_stock(self, exclude_user=None):
+        return max(self.stock_quantity - self.get_held_stock(exclude_user), 0)
+
     def get_stock_status(self):
         if self.stock_quantity == 0:
             return "Out of Stock"
@@ -309,6 +395,13 @@ class ProductReview(models.Model):
     def __str__(self):
         return f"{self.user.full_name} - {self.product.product_name} ({self.rating} stars)"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored rating so a later save can apply just the difference
+        instance._stored_rating = instance.__dict__.get('rating')
+        return instance
+
 class VariantImage(models.Model):
     variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='variant_images/')
@@ -382,13 +475,15 @@ class Coupon(models.Model):
         return True, "Coupon is valid."
 
     def calculate_discount(self, cart_total):
-        """Calculate discount amount for given cart total"""
+        """Discount in rupees (a paise-exact Decimal) for the given cart total"""
+        from .money import percentage_of, to_money
+        cart_total = to_money(cart_total)
         if self.discount_type == 'percentage':
-            discount = (float(cart_total) * float(self.discount_value)) / 100
+            discount = percentage_of(cart_total, self.discount_value)
             if self.maximum_discount:
-                discount = min(discount, self.maximum_discount)
+                discount = min(discount, to_money(self.maximum_discount))
         else:
-            discount = self.discount_value
+            discount = to_money(self.discount_value)
         
         # Ensure discount doesn't exceed cart total
         return min(discount, cart_total)
@@ -496,15 +591,30 @@ class Order(models.Model):
     # Razorpay fields
     razorpay_order_id = models.CharField(max_length=100, blank=True, null=True)
     razorpay_payment_id = models.CharField(max_length=100, blank=True, null=True)
+    cancellation_reason = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='order_created_id_idx'),
+            models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_id_idx'),
+            # Small partial index the expiry sweeper scans instead of the whole table
+            models.Index(fields=['created_at', 'id'], name='order_pending_online_idx',
+                         condition=models.Q(status='pending', payment_method='online')),
+        ]
 
     def __str__(self):
         return f"Order {self.order_number}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so a save can tell whether it actually changed
+        instance._stored_status = instance.__dict__.get('status')
+        return instance
+
     def can_be_cancelled(self):
         return any(item.can_be_cancelled() for item in self.items.all())
 
@@ -535,22 +645,20 @@ class Cart(models.Model):
     def get_total_items(self):
         return self.items.aggregate(total=models.Sum('quantity'))['total'] or 0
 
+    def get_pricing(self):
+        """Priced breakdown of the available lines (see vault.pricing.CartPricer)"""
+        from .pricing import CartPricer
+        return CartPricer(self.user).price(self)
+
     def get_subtotal(self):
-        total = 0
-        for item in self.items.all():
-            total += item.get_total_price()
-        return total
+        return self.get_pricing().subtotal
 
     def get_coupon_discount(self):
-        if self.applied_coupon:
-            subtotal = self.get_subtotal()
-            return self.applied_coupon.calculate_discount(subtotal)
-        return 0
+        return self.get_pricing().coupon_discount
 
     def get_total_price(self):
-        subtotal = self.get_subtotal()
-        discount = self.get_coupon_discount()
-        return subtotal - discount
+        pricing = self.get_pricing()
+        return pricing.subtotal - pricing.coupon_discount
 
     def get_items_count(self):
         return self.items.count()
@@ -570,16 +678,27 @@ class CartItem(models.Model):
         return f"{self.product.product_name} - {self.variant.get_color_display()} (x{self.quantity})"
 
     def get_total_price(self):
-        return self.product.get_discounted_price() * self.quantity
+        return self.get_unit_price() * self.quantity
 
     def get_unit_price(self):
-        return self.product.get_discounted_price()
+        """Price CartPricer worked out for this line, else the product's stored offer price"""
+        unit_price = getattr(self, 'unit_price', None)
+        if unit_price is None:
+            unit_price = self.product.get_discounted_price()
+        return unit_price
+
+    def get_available_stock(self):
+        """Variant stock less what other customers' pending checkouts hold"""
+        held = getattr(self, 'held_stock', None)
+        if held is None:
+            held = StockReservation.held_for(self.cart.user_id, variant=self.variant_id)
+        return max(self.variant.stock_quantity - held, 0)
 
     def is_available(self):
         return (not self.product.is_deleted and 
                 not self.product.category.is_deleted and 
                 self.variant.is_active and 
-                self.variant.stock_quantity >= self.quantity)
+                self.get_available_stock() >= self.quantity)
 
 class Wishlist(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='wishlist')
@@ -653,6 +772,46 @@ class OrderItem(models.Model):
             user=self.order.user
         ).first()
 
+class StockReservation(models.Model):
+    """Stock held for a pending online order between creating the payment and verifying it"""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='stock_reservations')
+    variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['variant', 'expires_at'], name='reservation_variant_exp_idx'),
+            models.Index(fields=['expires_at'], name='reservation_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x variant {self.variant_id} for order {self.order_id}"
+
+    @classmethod
+    def active(cls, exclude_user=None):
+        """Unexpired holds of orders still waiting for payment"""
+        holds = cls.objects.filter(expires_at__gt=timezone.now(), order__status='pending')
+        if exclude_user is not None:
+            holds = holds.exclude(order__user_id=exclude_user)
+        return holds
+
+    @classmethod
+    def held_for(cls, exclude_user=None, **filters):
+        return cls.active(exclude_user).filter(**filters).aggregate(
+            total=models.Sum('quantity')
+        )['total'] or 0
+
+    @classmethod
+    def held_subquery(cls, variant_ref, exclude_user=None):
+        """Correlated SUM of active holds for `variant_ref`, for annotating querysets as held_stock"""
+        holds = cls.active(exclude_user).filter(variant=variant_ref).order_by().values('variant')
+        return Coalesce(
+            models.Subquery(holds.annotate(total=models.Sum('quantity')).values('total')),
+            0, output_field=models.IntegerField()
+        )
+
 class Wallet(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='wallet')
     balance = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
@@ -662,39 +821,6 @@ class Wallet(models.Model):
     def __str__(self):
         return f"Wallet for {self.user.full_name} - Balance: ₹{self.balance}"
 
-    def add_money(self, amount, description=""):
-        from decimal import Decimal
-        amount = Decimal(str(amount))
-        with transaction.atomic():
-            self.balance += amount
-            self.save()
-            WalletTransaction.objects.create(
-                wallet=self,
-                transaction_type='credit',
-                amount=amount,
-                description=description
-            )
-            # Refresh to ensure balance is up-to-date
-            self.refresh_from_db()
-        return True
-
-    def deduct_money(self, amount, description=""):
-        from decimal import Decimal
-        amount = Decimal(str(amount))
-        if self.balance >= amount:
-            with transaction.atomic():
-                self.balance -= amount
-                self.save()
-                WalletTransaction.objects.create(
-                    wallet=self,
-                    transaction_type='debit',
-                    amount=amount,
-                    description=description
-                )
-                self.refresh_from_db()
-            return True
-        return False
-
 class WalletTransaction(models.Model):
     TRANSACTION_TYPES = [
         ('credit', 'Credit'), 
@@ -703,11 +829,17 @@ class WalletTransaction(models.Model):
     wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name='transactions')
     transaction_type = models.CharField(max_length=10, choices=TRANSACTION_TYPES)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
+    # Wallet balance right after this entry; entries are only ever appended, by vault.wallet
+    balance_after = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     description = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='wallettxn_created_id_idx'),
+            models.Index(fields=['wallet', 'id'], name='wallettxn_wallet_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.transaction_type.title()} - ₹{self.amount}"
@@ -745,3 +877,46 @@ class ReturnRequest(models.Model):
 
     def __str__(self):
         return f"Return Request for Order {self.order.order_number}"
+
+class IdempotencyKey(models.Model):
+    """A client-supplied request key and the response it got, so retries replay instead of repeating"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=64)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.TextField(blank=True, null=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        unique_together = ['user', 'key']
+
+    def __str__(self):
+        return f"{self.user_id}:{self.key}"
+
+class PaymentEvent(models.Model):
+    """A signed Razorpay webhook delivery, stored on receipt and settled by process_payment_events"""
+    STATUS_CHOICES = [
+        ('received', 'Received'),
+        ('processed', 'Processed'),
+        ('ignored', 'Ignored'),
+        ('failed', 'Failed'),
+    ]
+    event_id = models.CharField(max_length=100, unique=True)
+    event_type = models.CharField(max_length=50)
+    razorpay_order_id = models.CharField(max_length=100, blank=True, null=True, db_index=True)
+    razorpay_payment_id = models.CharField(max_length=100, blank=True, null=True)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='received')
+    note = models.TextField(blank=True, null=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='payment_event_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} {self.event_id} ({self.status})"
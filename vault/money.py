@@ -0,0 +1,77 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0.00')
+HUNDRED = Decimal('100')
+
+
+def to_money(value):
+    """Decimal rupees rounded half-up to paise; floats go through str() so 0.1 stays 0.10"""
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value or 0))
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def to_percentage(value):
+    """An offer or coupon percentage as a two-place Decimal, as the database stores it"""
+    return to_money(value)
+
+
+def to_paise(amount):
+    """Integer paise for the payment gateway; exact for any quantized amount"""
+    return int(to_money(amount) * 100)
+
+
+def from_paise(paise):
+    return (Decimal(int(paise)) / 100).quantize(CENT)
+
+
+def sum_money(amounts):
+    return sum((to_money(amount) for amount in amounts), ZERO)
+
+
+def line_total(unit_price, quantity):
+    return to_money(unit_price) * int(quantity)
+
+
+def sum_lines(lines):
+    """Total of (unit_price, quantity) pairs"""
+    return sum((line_total(unit_price, quantity) for unit_price, quantity in lines), ZERO)
+
+
+def percentage_of(amount, percentage):
+    """`percentage` percent of `amount`, rounded to paise"""
+    return to_money(to_money(amount) * to_percentage(percentage) / HUNDRED)
+
+
+def apply_percentage(amount, percentage):
+    """Amount after a percentage off, rounded the same way Postgres rounds numeric.
+
+    Computed as amount * (100 - pct) / 100 rather than amount - percentage_of()
+    so it matches refresh_effective_prices' UPDATE to the paisa.
+    """
+    return to_money(to_money(amount) * (HUNDRED - to_percentage(percentage)) / HUNDRED)
+
+
+def apply_percentages(amounts, percentage):
+    """apply_percentage over many amounts with the percentage converted once"""
+    multiplier = HUNDRED - to_percentage(percentage)
+    return [to_money(to_money(amount) * multiplier / HUNDRED) for amount in amounts]
+
+
+def allocate(amount, weights):
+    """Split `amount` across `weights` in whole paise, proportionally, so the parts sum to it exactly.
+
+    Leftover paise go to the parts with the largest remainders (ties to the earliest).
+    """
+    total_paise = to_paise(amount)
+    weights = [to_paise(weight) for weight in weights]
+    weight_sum = sum(weights)
+    if not weight_sum:
+        return [ZERO for _ in weights]
+    shares = [total_paise * weight // weight_sum for weight in weights]
+    leftover = total_paise - sum(shares)
+    by_remainder = sorted(range(len(weights)), key=lambda i: (-(total_paise * weights[i] % weight_sum), i))
+    for i in by_remainder[:leftover]:
+        shares[i] += 1
+    return [from_paise(share) for share in shares]
@@ -0,0 +1,49 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import CartItem, User, WishlistItem
+
+# Cart and wishlist changes delete the entry, but only from this process's cache
+# under the default per-process LocMemCache; other workers catch up when the entry
+# expires, so keep it to seconds. A shared CACHE_BACKEND makes the delete global.
+NAV_COUNTS_TIMEOUT = 15
+
+
+def nav_counts_key(user_id):
+    return f'nav_counts:{user_id}'
+
+
+def _per_user(items, user_field, aggregate):
+    return Coalesce(
+        Subquery(
+            items.filter(**{user_field: OuterRef('pk')}).order_by()
+            .values(user_field).annotate(total=aggregate).values('total')
+        ),
+        0, output_field=IntegerField()
+    )
+
+
+def get_nav_counts(user):
+    """{'cart': units in the cart, 'wishlist': wishlist items} for the navigation badges.
+
+    Served from the cache for up to NAV_COUNTS_TIMEOUT seconds; a miss costs
+    one query for both numbers.
+    """
+    key = nav_counts_key(user.pk)
+    counts = cache.get(key)
+    if counts is None:
+        row = User.objects.filter(pk=user.pk).annotate(
+            cart_units=_per_user(CartItem.objects.all(), 'cart__user', Sum('quantity')),
+            wishlist_items=_per_user(WishlistItem.objects.all(), 'wishlist__user', Count('pk')),
+        ).values('cart_units', 'wishlist_items').first() or {'cart_units': 0, 'wishlist_items': 0}
+        counts = {'cart': row['cart_units'], 'wishlist': row['wishlist_items']}
+        cache.set(key, counts, NAV_COUNTS_TIMEOUT)
+    return counts
+
+
+def invalidate_nav_counts(user_id):
+    """Drop the user's cached counts once the current transaction commits, so a
+    concurrent page view can't cache the old numbers again"""
+    transaction.on_commit(lambda: cache.delete(nav_counts_key(user_id)))
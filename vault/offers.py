@@ -0,0 +1,159 @@
+import heapq
+from collections import namedtuple
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from .models import CategoryOffer, Coupon, Product
+from .pricing import refresh_effective_prices
+
+NEXT_TRANSITION_KEY = 'offers:next_transition'
+CATALOG_VERSION_KEY = 'catalog:version'
+COUPONS_VERSION_KEY = 'coupons:version'
+
+# Upper bound for anything cached against the offer timeline
+MAX_CACHE_TIMEOUT = 60 * 15
+
+# Offers are valid up to and including valid_until, so a window only
+# closes once that instant has passed
+CLOSE_GRACE = timedelta(seconds=1)
+
+Transition = namedtuple('Transition', ['at', 'kind', 'object_id', 'category_id'])
+
+
+def _next_after(model, now):
+    bounds = model.objects.filter(is_active=True).aggregate(
+        next_start=Min('valid_from', filter=Q(valid_from__gt=now)),
+        next_end=Min('valid_until', filter=Q(valid_until__gt=now - CLOSE_GRACE)),
+    )
+    candidates = [bounds['next_start']]
+    if bounds['next_end']:
+        candidates.append(bounds['next_end'] + CLOSE_GRACE)
+    return min((at for at in candidates if at), default=None)
+
+
+def next_transition(now=None):
+    """When the next category offer or coupon window opens or closes, or None"""
+    now = now or timezone.now()
+    cached = cache.get(NEXT_TRANSITION_KEY)
+    if cached is not None and (cached == 'none' or cached > now):
+        return None if cached == 'none' else cached
+
+    upcoming = [at for at in (_next_after(CategoryOffer, now), _next_after(Coupon, now)) if at]
+    at = min(upcoming, default=None)
+    if at is None:
+        cache.set(NEXT_TRANSITION_KEY, 'none', MAX_CACHE_TIMEOUT)
+    else:
+        cache.set(NEXT_TRANSITION_KEY, at, max(1, min(MAX_CACHE_TIMEOUT, int((at - now).total_seconds()))))
+    return at
+
+
+def cache_timeout_until_next_transition(default=MAX_CACHE_TIMEOUT, now=None):
+    """Seconds a price-dependent cache entry may live before the next offer change"""
+    now = now or timezone.now()
+    at = next_transition(now)
+    if at is None:
+        return default
+    return max(1, min(default, int((at - now).total_seconds())))
+
+
+def get_cache_version(key):
+    return cache.get_or_set(key, 1, None)
+
+
+def bump_cache_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, None)
+
+
+def cached_catalog_value(name, builder):
+    """Cache a price-dependent value until the catalog changes or the next offer transition"""
+    key = f'catalog:{get_cache_version(CATALOG_VERSION_KEY)}:{name}'
+    value = cache.get(key)
+    if value is None:
+        value = builder()
+        cache.set(key, value, cache_timeout_until_next_transition())
+    return value
+
+
+def cached_coupon_value(name, builder):
+    """Cache a coupon-window-dependent value until coupons change or the next transition"""
+    key = f'coupons:{get_cache_version(COUPONS_VERSION_KEY)}:{name}'
+    value = cache.get(key)
+    if value is None:
+        value = builder()
+        cache.set(key, value, cache_timeout_until_next_transition())
+    return value
+
+
+def invalidate_offer_caches(catalog=True, coupons=True):
+    cache.delete(NEXT_TRANSITION_KEY)
+    if catalog:
+        bump_cache_version(CATALOG_VERSION_KEY)
+    if coupons:
+        bump_cache_version(COUPONS_VERSION_KEY)
+
+
+class OfferTimeline:
+    """Min-heap of upcoming offer and coupon window boundaries"""
+
+    def __init__(self, horizon=timedelta(days=7)):
+        self.horizon = horizon
+        self._heap = []
+        self.loaded_at = None
+
+    def load(self, now=None):
+        now = now or timezone.now()
+        until = now + self.horizon
+        heap = []
+
+        offers = CategoryOffer.objects.filter(is_active=True).filter(
+            Q(valid_from__gt=now, valid_from__lte=until) | Q(valid_until__gt=now - CLOSE_GRACE, valid_until__lte=until)
+        ).values_list('id', 'category_id', 'valid_from', 'valid_until')
+        for offer_id, category_id, valid_from, valid_until in offers:
+            if now < valid_from <= until:
+                heap.append(Transition(valid_from, 'offer_start', offer_id, category_id))
+            if now < valid_until + CLOSE_GRACE and valid_until <= until:
+                heap.append(Transition(valid_until + CLOSE_GRACE, 'offer_end', offer_id, category_id))
+
+        coupons = Coupon.objects.filter(is_active=True).filter(
+            Q(valid_from__gt=now, valid_from__lte=until) | Q(valid_until__gt=now - CLOSE_GRACE, valid_until__lte=until)
+        ).values_list('id', 'valid_from', 'valid_until')
+        for coupon_id, valid_from, valid_until in coupons:
+            if now < valid_from <= until:
+                heap.append(Transition(valid_from, 'coupon_start', coupon_id, None))
+            if now < valid_until + CLOSE_GRACE and valid_until <= until:
+                heap.append(Transition(valid_until + CLOSE_GRACE, 'coupon_end', coupon_id, None))
+
+        heapq.heapify(heap)
+        self._heap = heap
+        self.loaded_at = now
+        return len(heap)
+
+    def next_at(self):
+        return self._heap[0].at if self._heap else None
+
+    def pop_due(self, now=None):
+        now = now or timezone.now()
+        due = []
+        while self._heap and self._heap[0].at <= now:
+            due.append(heapq.heappop(self._heap))
+        return due
+
+
+def apply_transitions(transitions):
+    """Reprice categories whose offers opened or closed and drop the caches that depend on them"""
+    category_ids = {t.category_id for t in transitions if t.kind.startswith('offer_')}
+    coupons_changed = any(t.kind.startswith('coupon_') for t in transitions)
+
+    repriced = 0
+    if category_ids:
+        repriced = refresh_effective_prices(Product.objects.filter(category_id__in=category_ids))
+
+    if transitions:
+        invalidate_offer_caches(catalog=bool(category_ids), coupons=coupons_changed)
+    return repriced
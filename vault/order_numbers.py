@@ -0,0 +1,33 @@
+from django.db import connection
+from django.utils import timezone
+
+SEQUENCE = 'vault_order_number_seq'
+PREFIX = 'ORD'
+
+# ORD + YYYYMMDD + 8 digits = 19 characters, inside Order.order_number's max_length of 20
+SERIAL_DIGITS = 8
+
+
+def format_order_number(serial, day=None):
+    day = day or timezone.localdate()
+    return f"{PREFIX}{day:%Y%m%d}{serial:0{SERIAL_DIGITS}d}"
+
+
+def next_order_numbers(count):
+    """Reserve `count` order numbers with one round trip to the sequence.
+
+    nextval() never hands the same value out twice, even across transactions
+    that roll back, so numbers are unique without a retry loop and increase in
+    the order they were issued. Rolled-back checkouts leave gaps.
+    """
+    if count <= 0:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT nextval('{SEQUENCE}') FROM generate_series(1, %s)", [count])
+        serials = sorted(row[0] for row in cursor.fetchall())
+    day = timezone.localdate()
+    return [format_order_number(serial, day) for serial in serials]
+
+
+def next_order_number():
+    return next_order_numbers(1)[0]
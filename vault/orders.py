@@ -0,0 +1,228 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .coupons import redeem_coupon
+from .dashboard import invalidate_dashboard
+from .inventory import InsufficientStock, release_reservations, reserve_stock, take_stock
+from .models import Cart, Order, OrderItem
+from .order_numbers import next_order_number
+from .pricing import CartPricer
+from .wallet import InsufficientBalance, credit, debit
+
+logger = logging.getLogger(__name__)
+
+EXPIRED_REASON = 'Payment not completed in time'
+
+
+class OrderPlacementError(Exception):
+    """Checkout can't go through; the message is safe to show to the customer"""
+
+
+def quote_cart(user, cart):
+    """Price the cart for an order; drops a coupon that no longer applies. Returns a CartBreakdown"""
+    quote = CartPricer(user).price(cart)
+    if not quote.lines:
+        raise OrderPlacementError('No available items in cart.')
+    if quote.coupon_error:
+        cart.applied_coupon = None
+        cart.save(update_fields=['applied_coupon', 'updated_at'])
+    return quote
+
+
+def _lock_cart(user):
+    """Lock the user's cart so a double-submitted checkout waits for the first one"""
+    try:
+        return Cart.objects.select_for_update().get(user=user)
+    except Cart.DoesNotExist:
+        raise OrderPlacementError('Cart is empty.')
+
+
+def _create_order(user, address, quote, payment_method, **fields):
+    order = Order.objects.create(
+        user=user,
+        order_number=next_order_number(),
+        subtotal=quote.subtotal,
+        coupon=quote.coupon,
+        coupon_discount=quote.coupon_discount,
+        shipping_charge=quote.shipping_charge,
+        total_amount=quote.total_amount,
+        payment_method=payment_method,
+        shipping_address=address,
+        status='pending',
+        **fields
+    )
+    OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order,
+            product=line.item.product,
+            variant=line.item.variant,
+            quantity=line.item.quantity,
+            price=line.unit_price
+        )
+        for line in quote.lines
+    ])
+    return order
+
+
+def _redeem_coupon(order):
+    """Use up the order's coupon; False when its last slot went to someone else"""
+    return not order.coupon_id or redeem_coupon(order.coupon_id, order.user, order)
+
+
+def _clear_cart(cart):
+    cart.items.all().delete()
+    cart.applied_coupon = None
+    cart.save(update_fields=['applied_coupon', 'updated_at'])
+
+
+def place_order(user, address, payment_method='cod'):
+    """Place a COD or wallet order from the user's cart in one transaction.
+
+    Stock, the wallet debit, coupon usage and clearing the cart all commit
+    together or not at all. Raises OrderPlacementError or InsufficientStock,
+    both with a customer-facing message.
+    """
+    with transaction.atomic():
+        cart = _lock_cart(user)
+        quote = quote_cart(user, cart)
+
+        take_stock(((line.item.variant_id, line.item.quantity) for line in quote.lines), exclude_user=user.pk)
+        order = _create_order(user, address, quote, payment_method)
+
+        wallet = None
+        if payment_method == 'wallet':
+            try:
+                wallet = debit(user.pk, order.total_amount, f"Payment for Order #{order.order_number}").wallet
+            except InsufficientBalance as exc:
+                raise OrderPlacementError(str(exc))
+            order.status = 'confirmed'
+            order.save(update_fields=['status', 'updated_at'])
+
+        if not _redeem_coupon(order):
+            raise OrderPlacementError(f"Coupon {quote.coupon.code} is no longer available. Please remove it and try again.")
+        _clear_cart(cart)
+        # Earlier online checkouts of this cart are superseded; stop holding their stock
+        release_reservations(Order.objects.filter(user=user, status='pending'))
+    return order, wallet
+
+
+def create_pending_online_order(user, address, quote, razorpay_order_id):
+    """Record an online order awaiting payment and hold its stock until the payment is verified.
+
+    Raises InsufficientStock when other checkouts have taken or hold the stock.
+    """
+    with transaction.atomic():
+        release_reservations(Order.objects.filter(user=user, status='pending'))
+        order = _create_order(user, address, quote, 'online', razorpay_order_id=razorpay_order_id)
+        reserve_stock(order, [(line.item.variant_id, line.item.quantity) for line in quote.lines])
+    return order
+
+
+def renew_reservation(order):
+    """Hold a pending order's stock again for a payment retry; raises InsufficientStock"""
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(pk=order.pk)
+        if order.status != 'pending':
+            raise OrderPlacementError('This order cannot be retried.')
+        reserve_stock(order, list(order.items.filter(status='active').values_list('variant_id', 'quantity')))
+    return order
+
+
+def expired_unpaid(order):
+    """True for an online order the sweeper cancelled before any payment arrived"""
+    return order.status == 'cancelled' and order.cancellation_reason == EXPIRED_REASON and not order.razorpay_payment_id
+
+
+def confirm_online_payment(order_id, user, razorpay_payment_id):
+    """Confirm a paid online order: take its stock, redeem its coupon and clear the cart atomically.
+
+    The order's stock hold is converted into a real decrement (or dropped). Safe
+    to call twice for the same payment; an order that is no longer pending is
+    returned unchanged. If the stock ran out while the customer was paying,
+    the order is cancelled, the payment is credited to their wallet and
+    InsufficientStock is raised. `user` scopes the lookup for customer-facing
+    callers; webhooks and reconciliation pass None.
+    """
+    orders = Order.objects.select_for_update()
+    if user is not None:
+        orders = orders.filter(user=user)
+    with transaction.atomic():
+        order = orders.get(id=order_id)
+        if expired_unpaid(order):
+            # Paid after the order expired; the stock is gone, so refund instead
+            order.razorpay_payment_id = razorpay_payment_id
+            order.save(update_fields=['razorpay_payment_id', 'updated_at'])
+            credit(order.user_id, order.total_amount, f"Refund for Order #{order.order_number} (paid after it expired)")
+            return order
+        if order.status != 'pending':
+            return order
+        user = order.user
+
+        order.razorpay_payment_id = razorpay_payment_id
+        items = list(order.items.filter(status='active').values_list('variant_id', 'quantity'))
+        try:
+            with transaction.atomic():
+                take_stock(items, exclude_user=user.pk)
+        except InsufficientStock as exc:
+            # Commit the cancellation and refund, then report the shortage
+            shortage = exc
+            order.status = 'cancelled'
+            order.cancellation_reason = 'Out of stock when payment completed'
+            order.save(update_fields=['razorpay_payment_id', 'status', 'cancellation_reason', 'updated_at'])
+            order.items.update(status='cancelled')
+            credit(user.pk, order.total_amount, f"Refund for Order #{order.order_number} (out of stock)")
+        else:
+            shortage = None
+            order.status = 'confirmed'
+            order.save(update_fields=['razorpay_payment_id', 'status', 'updated_at'])
+            if not _redeem_coupon(order):
+                # The customer has already paid the discounted total, so honour it
+                logger.warning(f"Coupon {order.coupon_id} ran out before order {order.order_number} was paid; discount kept")
+
+            # Payment may settle long after checkout (webhook, reconciliation), so
+            # only drop what was bought and leave anything added since
+            cart = Cart.objects.filter(user=user).first()
+            if cart is not None:
+                cart.items.filter(variant_id__in=[variant_id for variant_id, _ in items]).delete()
+                if cart.applied_coupon_id and cart.applied_coupon_id == order.coupon_id:
+                    cart.applied_coupon = None
+                    cart.save(update_fields=['applied_coupon', 'updated_at'])
+        release_reservations([order])
+
+    if shortage is not None:
+        raise shortage
+    return order
+
+
+def expire_abandoned_orders(older_than=None, batch_size=500):
+    """Cancel unpaid online orders older than `older_than` in chunks; returns how many.
+
+    Each chunk is claimed with SKIP LOCKED, so sweepers on several nodes split
+    the work, and an order a payment is being confirmed for right now is left
+    for the next run. Unpaid orders never took stock, so releasing their holds
+    is all the restocking needed.
+    """
+    if older_than is None:
+        older_than = timedelta(hours=settings.PENDING_ORDER_EXPIRY_HOURS)
+    cutoff = timezone.now() - older_than
+    expired = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                Order.objects.select_for_update(skip_locked=True)
+                .filter(status='pending', payment_method='online', created_at__lte=cutoff)
+                .order_by('created_at', 'id').values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                return expired
+            Order.objects.filter(id__in=ids).update(
+                status='cancelled', cancellation_reason=EXPIRED_REASON, updated_at=timezone.now()
+            )
+            OrderItem.objects.filter(order_id__in=ids, status='active').update(status='cancelled', updated_at=timezone.now())
+            release_reservations(ids)
+            transaction.on_commit(invalidate_dashboard)
+        expired += len(ids)
@@ -0,0 +1,199 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from decimal import Decimal
+from functools import cached_property
+
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+
+# Below this many estimated rows an exact COUNT is cheap enough to run
+EXACT_COUNT_THRESHOLD = 10000
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'dec': str(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        if 'dec' in value:
+            return Decimal(value['dec'])
+        raise InvalidCursor("Unknown cursor value")
+    return value
+
+
+def encode_cursor(direction, values, ordering_key=''):
+    payload = json.dumps([direction, [_encode_value(v) for v in values], ordering_key], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """(direction, values, ordering_key) from a cursor token; raises InvalidCursor"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        direction, values, ordering_key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if direction not in ('next', 'prev') or not isinstance(values, list) or not isinstance(ordering_key, str):
+            raise InvalidCursor("Malformed cursor")
+        return direction, [_decode_value(v) for v in values], ordering_key
+    except (ValueError, TypeError, binascii.Error) as exc:
+        raise InvalidCursor("Malformed cursor") from exc
+
+
+def estimate_count(queryset):
+    """Planner row estimate for a queryset, without scanning it"""
+    compiler = queryset.order_by().query.get_compiler(using=queryset.db)
+    sql, params = compiler.as_sql()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class CursorPaginator:
+    """Keyset paginator: each page is one indexed range query, however deep it is.
+
+    `ordering` must end in a unique field (usually id) so every row has a
+    distinct position. Pages are addressed by opaque cursor tokens instead of
+    page numbers.
+    """
+
+    def __init__(self, queryset, per_page, ordering=('-created_at', '-id'), count='estimate'):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = list(ordering)
+        self.count_mode = count
+
+    @property
+    def ordering_key(self):
+        """Cursors are only valid for the ordering they were made under"""
+        return ','.join(self.ordering)
+
+    def _fields(self, reverse=False):
+        fields = []
+        for item in self.ordering:
+            descending = item.startswith('-')
+            fields.append((item.lstrip('-'), descending != reverse))
+        return fields
+
+    def _seek(self, values, reverse):
+        """Rows strictly after `values` in (possibly reversed) ordering order"""
+        condition = Q()
+        fields = self._fields(reverse)
+        for i, (name, descending) in enumerate(fields):
+            step = Q(**{f"{name}__{'lt' if descending else 'gt'}": values[i]})
+            for j in range(i):
+                step &= Q(**{fields[j][0]: values[j]})
+            condition |= step
+        return condition
+
+    def _position(self, obj):
+        values = []
+        for name, _ in self._fields():
+            value = obj
+            for part in name.split('__'):
+                value = getattr(value, part)
+            values.append(value)
+        return values
+
+    def page(self, cursor=None):
+        """The page after (or before) `cursor`; a malformed, tampered or foreign cursor gives the first page"""
+        direction, values = 'next', None
+        if cursor:
+            try:
+                direction, values, ordering_key = decode_cursor(cursor)
+            except InvalidCursor:
+                direction, values, ordering_key = 'next', None, None
+            if values is not None and (ordering_key != self.ordering_key or len(values) != len(self.ordering)):
+                direction, values = 'next', None
+
+        reverse = direction == 'prev'
+        queryset = self.queryset
+        if values is not None:
+            try:
+                queryset = queryset.filter(self._seek(values, reverse))
+            except (ValidationError, ValueError, TypeError):
+                # Values of the wrong type for their fields
+                direction, values, reverse = 'next', None, False
+        order = [f"{'-' if descending else ''}{name}" for name, descending in self._fields(reverse)]
+        rows = list(queryset.order_by(*order)[:self.per_page + 1])
+
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+            has_next, has_previous = values is not None, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+        return CursorPage(rows, self, has_next, has_previous)
+
+    @cached_property
+    def _total(self):
+        if self.count_mode is None:
+            return None, False
+        if self.count_mode == 'estimate':
+            estimate = estimate_count(self.queryset)
+            if estimate >= EXACT_COUNT_THRESHOLD:
+                return estimate, True
+        return self.queryset.count(), False
+
+    @property
+    def count(self):
+        """Exact total, or the planner's estimate when count='estimate' and the result is large"""
+        return self._total[0]
+
+    @property
+    def count_is_estimate(self):
+        return self._total[1]
+
+
+class CursorPage:
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next and bool(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous and bool(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @cached_property
+    def next_cursor(self):
+        if not self.has_next():
+            return None
+        return encode_cursor('next', self.paginator._position(self.object_list[-1]), self.paginator.ordering_key)
+
+    @cached_property
+    def previous_cursor(self):
+        if not self.has_previous():
+            return None
+        return encode_cursor('prev', self.paginator._position(self.object_list[0]), self.paginator.ordering_key)
@@ -0,0 +1,97 @@
+import hashlib
+import hmac
+import json
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+from .inventory import InsufficientStock
+from .models import Order, PaymentEvent
+from .money import to_paise
+from .orders import confirm_online_payment, expired_unpaid
+
+logger = logging.getLogger(__name__)
+
+# Give up on an event after this many processing errors
+MAX_ATTEMPTS = 5
+
+SETTLING_EVENTS = ('payment.captured', 'order.paid')
+
+
+def verify_webhook_signature(body, signature, secret):
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature or '')
+
+
+def record_event(body, event_id=None):
+    """Store a verified webhook delivery once; returns (event, created). Raises ValueError on bad JSON"""
+    payload = json.loads(body)
+    payment = payload.get('payload', {}).get('payment', {}).get('entity', {})
+    # Razorpay sends X-Razorpay-Event-Id; redeliveries of the same event reuse it
+    event_id = event_id or hashlib.sha256(body).hexdigest()
+    return PaymentEvent.objects.get_or_create(event_id=event_id, defaults={
+        'event_type': payload.get('event', ''),
+        'razorpay_order_id': payment.get('order_id'),
+        'razorpay_payment_id': payment.get('id'),
+        'payload': payload,
+    })
+
+
+def settle_payment(payment):
+    """Confirm the pending order a captured payment belongs to; returns (status, note).
+
+    A payment for an order that expired unpaid is refunded to the customer's wallet.
+    """
+    order = Order.objects.filter(razorpay_order_id=payment.get('order_id'), payment_method='online').first()
+    if order is None:
+        return 'ignored', f"No order for Razorpay order {payment.get('order_id')}"
+    expired = expired_unpaid(order)
+    if order.status != 'pending' and not expired:
+        return 'processed', f"Order {order.order_number} already {order.status}"
+    if int(payment.get('amount', -1)) != to_paise(order.total_amount):
+        return 'failed', f"Paid {payment.get('amount')} paise but order {order.order_number} is {order.total_amount}"
+    if expired:
+        confirm_online_payment(order.id, None, payment['id'])
+        return 'processed', f"Order {order.order_number} had expired; payment refunded to wallet"
+
+    try:
+        confirm_online_payment(order.id, None, payment['id'])
+    except InsufficientStock as e:
+        return 'processed', f"Order {order.order_number} cancelled and refunded to wallet: {e}"
+    return 'processed', f"Order {order.order_number} confirmed"
+
+
+def process_event(event):
+    try:
+        payment = event.payload.get('payload', {}).get('payment', {}).get('entity', {})
+        if event.event_type in SETTLING_EVENTS:
+            with transaction.atomic():
+                event.status, event.note = settle_payment(payment)
+        elif event.event_type == 'payment.failed':
+            # The order stays pending so the customer can retry the payment
+            event.status = 'processed'
+            event.note = payment.get('error_description') or 'Payment failed'
+        else:
+            event.status, event.note = 'ignored', f"Unhandled event type {event.event_type}"
+    except Exception as e:
+        logger.error(f"Error processing payment event {event.event_id}: {e}")
+        event.attempts += 1
+        event.status = 'failed' if event.attempts >= MAX_ATTEMPTS else 'received'
+        event.note = repr(e)
+    if event.status != 'received':
+        event.processed_at = timezone.now()
+    event.save(update_fields=['status', 'note', 'attempts', 'processed_at'])
+    return event
+
+
+def process_pending_events(batch_size=50):
+    """Settle up to batch_size received events; parallel workers skip each other's rows"""
+    with transaction.atomic():
+        events = list(
+            PaymentEvent.objects.select_for_update(skip_locked=True)
+            .filter(status='received').order_by('id')[:batch_size]
+        )
+        for event in events:
+            process_event(event)
+    return events
@@ -0,0 +1,149 @@
+from collections import namedtuple
+from decimal import Decimal
+
+from django.db.models import F, Value, FloatField, DecimalField, CharField, OuterRef, Subquery, Case, When
+from django.db.models.functions import Cast, Coalesce, Greatest
+from django.db.models.lookups import GreaterThan
+from django.utils import timezone
+
+from .inventory import with_held_stock
+from .models import CategoryOffer, Product
+from .money import ZERO, apply_percentage, line_total, sum_money, to_percentage
+
+FREE_SHIPPING_THRESHOLD = Decimal('500')
+SHIPPING_CHARGE = Decimal('50.00')
+
+PricedLine = namedtuple('PricedLine', ['item', 'unit_price', 'offer_percentage', 'line_total'])
+CartBreakdown = namedtuple('CartBreakdown', [
+    'lines', 'unavailable_items', 'subtotal', 'coupon', 'coupon_discount', 'coupon_error',
+    'shipping_charge', 'total_amount',
+])
+
+
+def active_category_offers(category_ref, now=None):
+    """Running offers for a category, best discount first"""
+    now = now or timezone.now()
+    return CategoryOffer.objects.filter(
+        category=category_ref,
+        is_active=True,
+        valid_from__lte=now,
+        valid_until__gte=now
+    ).order_by('-discount_percentage', '-created_at')
+
+
+def refresh_effective_prices(products=None, now=None):
+    """Recompute the stored best-offer pricing for a product queryset with one UPDATE"""
+    if products is None:
+        products = Product.objects.all()
+
+    offers = active_category_offers(OuterRef('category'), now)
+    category_offer = Coalesce(
+        Cast(Subquery(offers.values('discount_percentage')[:1]), FloatField()),
+        Value(0.0)
+    )
+    best_offer = Greatest(F('product_offer'), category_offer)
+    offer_as_decimal = Cast(best_offer, DecimalField(max_digits=5, decimal_places=2))
+
+    return products.order_by().update(
+        applied_offer=best_offer,
+        effective_price=Cast(
+            F('price') * (Value(100) - offer_as_decimal) / Value(100),
+            DecimalField(max_digits=10, decimal_places=2)
+        ),
+        offer_source=Case(
+            When(GreaterThan(F('product_offer'), category_offer), then=Value('product')),
+            When(GreaterThan(category_offer, Value(0.0)), then=Value('category')),
+            default=Value('none'),
+            output_field=CharField()
+        ),
+        applied_category_offer=Case(
+            When(GreaterThan(F('product_offer'), category_offer), then=None),
+            default=Subquery(offers.values('id')[:1])
+        ),
+    )
+
+
+def shipping_for(discounted_subtotal):
+    return SHIPPING_CHARGE if discounted_subtotal < FREE_SHIPPING_THRESHOLD else ZERO
+
+
+class CartPricer:
+    """Prices a cart in a fixed number of queries, however many lines it has.
+
+    One query loads the lines with their product, category, variant and the
+    stock other checkouts hold; one more loads the running offers of every
+    category in the cart; a coupon adds its per-user usage check. Offers are
+    applied live, so a cart never lags an offer that started or ended since
+    refresh_effective_prices last ran.
+    """
+
+    def __init__(self, user, now=None):
+        self.user = user
+        self.now = now or timezone.now()
+
+    def load_items(self, cart, prefetch_images=False):
+        items = cart.items.select_related('product__category', 'variant').order_by('added_at', 'id')
+        if prefetch_images:
+            items = items.prefetch_related('variant__images')
+        return list(with_held_stock(items, self.user))
+
+    def category_offers(self, category_ids):
+        """Best running offer percentage per category, in one DISTINCT ON query"""
+        offers = (
+            CategoryOffer.objects.filter(
+                category_id__in=category_ids,
+                is_active=True,
+                valid_from__lte=self.now,
+                valid_until__gte=self.now
+            )
+            .order_by('category_id', '-discount_percentage', '-created_at').distinct('category_id')
+            .values_list('category_id', 'discount_percentage')
+        )
+        return {category_id: to_percentage(percentage) for category_id, percentage in offers}
+
+    def price(self, cart, items=None, coupon=False):
+        """Break the cart down into priced lines and totals.
+
+        `items` reuses lines already loaded with load_items(); `coupon` overrides
+        the cart's applied coupon (None prices without one).
+        """
+        if items is None:
+            items = self.load_items(cart)
+        if coupon is False:
+            coupon = cart.applied_coupon
+        offers = self.category_offers({item.product.category_id for item in items})
+
+        lines = []
+        unavailable_items = []
+        for item in items:
+            product = item.product
+            offer = max(to_percentage(product.product_offer), offers.get(product.category_id, ZERO))
+            item.unit_price = apply_percentage(product.price, offer)
+            item.total_price = line_total(item.unit_price, item.quantity)
+            if item.is_available():
+                lines.append(PricedLine(item, item.unit_price, offer, item.total_price))
+            else:
+                unavailable_items.append(item)
+
+        subtotal = sum_money(line.line_total for line in lines)
+        coupon_discount = ZERO
+        coupon_error = None
+        if coupon is not None:
+            is_valid, message = coupon.is_valid(self.user, subtotal)
+            if is_valid:
+                coupon_discount = coupon.calculate_discount(subtotal)
+            else:
+                coupon, coupon_error = None, message
+
+        discounted_subtotal = subtotal - coupon_discount
+        shipping_charge = shipping_for(discounted_subtotal)
+        return CartBreakdown(
+            lines=lines,
+            unavailable_items=unavailable_items,
+            subtotal=subtotal,
+            coupon=coupon,
+            coupon_discount=coupon_discount,
+            coupon_error=coupon_error,
+            shipping_charge=shipping_charge,
+            total_amount=discounted_subtotal + shipping_charge,
+        )
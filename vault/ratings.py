@@ -0,0 +1,60 @@
+from django.db.models import Case, Count, DecimalField, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
+from django.db.models.lookups import GreaterThan
+
+from .models import Product, ProductReview
+
+STARS = range(1, 6)
+
+
+def _average(rating_sum, rating_count):
+    return Case(
+        When(GreaterThan(rating_count, 0), then=Cast(
+            Cast(rating_sum, DecimalField(max_digits=12, decimal_places=4)) / rating_count,
+            DecimalField(max_digits=3, decimal_places=2)
+        )),
+        default=Value(0),
+        output_field=DecimalField(max_digits=3, decimal_places=2)
+    )
+
+
+def apply_rating_change(product_id, old_rating=None, new_rating=None):
+    """Move a product's review summary by one review being added, changed or removed, in one UPDATE"""
+    if old_rating == new_rating:
+        return 0
+    count_delta = (new_rating is not None) - (old_rating is not None)
+    sum_delta = (new_rating or 0) - (old_rating or 0)
+
+    updates = {
+        'rating_count': F('rating_count') + count_delta,
+        'rating_sum': F('rating_sum') + sum_delta,
+        # SET expressions see the row as it was, so apply the deltas here too
+        'rating_average': _average(F('rating_sum') + sum_delta, F('rating_count') + count_delta),
+    }
+    if old_rating is not None:
+        updates[f'rating_{old_rating}_count'] = F(f'rating_{old_rating}_count') - 1
+    if new_rating is not None:
+        updates[f'rating_{new_rating}_count'] = F(f'rating_{new_rating}_count') + 1
+    return Product.objects.filter(pk=product_id).update(**updates)
+
+
+def rebuild_rating_summaries(products=None):
+    """Recompute the stored review summary from ProductReview with one UPDATE"""
+    if products is None:
+        products = Product.objects.all()
+
+    reviews = ProductReview.objects.filter(product=OuterRef('pk')).order_by().values('product')
+
+    def aggregate(expression):
+        return Coalesce(Subquery(reviews.annotate(value=expression).values('value')), 0, output_field=IntegerField())
+
+    rating_count = aggregate(Count('id'))
+    rating_sum = aggregate(Sum('rating'))
+    updates = {
+        'rating_count': rating_count,
+        'rating_sum': rating_sum,
+        'rating_average': _average(rating_sum, rating_count),
+    }
+    for stars in STARS:
+        updates[f'rating_{stars}_count'] = aggregate(Count('id', filter=Q(rating=stars)))
+    return products.order_by().update(**updates)
@@ -0,0 +1,166 @@
+from collections import namedtuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from .dashboard import invalidate_dashboard
+from .inventory import release_reservations, restock
+from .models import ItemReturnRequest, Order, OrderItem, ReturnRequest, StockReservation
+from .money import ZERO, allocate
+from .wallet import bulk_credit
+
+ApprovedReturns = namedtuple('ApprovedReturns', ['order_returns', 'item_returns', 'refunded'])
+
+
+class RefundError(Exception):
+    """The order or item can't be cancelled or returned; the message is safe to show"""
+
+
+def _item_refunds(order, items):
+    """{item id: what the customer paid for it}, the order's coupon discount split over all its items"""
+    items = sorted(items, key=lambda item: item.pk)
+    shares = allocate(order.coupon_discount, [item.get_total_price() for item in items])
+    return {item.pk: item.get_total_price() - share for item, share in zip(items, shares)}
+
+
+def _order_refund(order, items):
+    """The order total less what was already refunded for items cancelled or returned on their own"""
+    refunds = _item_refunds(order, items)
+    return order.total_amount - sum((refunds[item.pk] for item in items if item.status != 'active'), ZERO)
+
+
+def _is_paid(order):
+    # Online orders are only paid once confirmed; wallet orders are paid when placed
+    return order.payment_method == 'wallet' or (order.payment_method == 'online' and order.status != 'pending')
+
+
+def _close_items(items, status, credits, restocked=True):
+    """Flip items to `status`, put them back in stock and post the wallet credits, a statement or two each"""
+    now = timezone.now()
+    for item in items:
+        item.status = status
+        item.updated_at = now
+    OrderItem.objects.bulk_update(items, ['status', 'updated_at'])
+    if restocked:
+        restock((item.variant_id, item.quantity) for item in items)
+    bulk_credit([credit for credit in credits if credit[1] > 0])
+
+
+def _awaiting_payment(order):
+    # A pending online order only holds its stock; nothing was taken or paid yet
+    return order.payment_method == 'online' and order.status == 'pending'
+
+
+def cancel_order(order_id, user=None):
+    """Cancel an order and its active items, restock them and refund a paid order to the wallet.
+
+    An order still awaiting payment just drops its stock hold. `user` scopes
+    the lookup for customers; admins pass None. Returns the amount refunded;
+    raises RefundError when the order is already closed.
+    """
+    orders = Order.objects.select_for_update()
+    if user is not None:
+        orders = orders.filter(user=user)
+    with transaction.atomic():
+        order = orders.get(pk=order_id)
+        if order.status in ('cancelled', 'returned'):
+            raise RefundError("This order cannot be cancelled.")
+        items = list(order.items.all())
+        refund = _order_refund(order, items) if _is_paid(order) else ZERO
+        awaiting_payment = _awaiting_payment(order)
+        if awaiting_payment:
+            release_reservations([order])
+
+        order.status = 'cancelled'
+        order.save(update_fields=['status', 'updated_at'])
+        _close_items(
+            [item for item in items if item.status == 'active'],
+            'cancelled',
+            [(order.user_id, refund, f"Refund for cancelled order #{order.order_number}")],
+            restocked=not awaiting_payment,
+        )
+    return refund
+
+
+def cancel_order_item(item_id, user):
+    """Cancel one active item of the user's order, restock it and refund its share if the order was paid.
+
+    Returns (item, refund); raises RefundError when it can't be cancelled.
+    """
+    with transaction.atomic():
+        order = Order.objects.select_for_update(of=('self',)).get(items=item_id, user=user)
+        items = list(order.items.select_related('product', 'order').order_by('id'))
+        item = next(item for item in items if item.pk == int(item_id))
+        if not item.can_be_cancelled():
+            raise RefundError("This item cannot be cancelled.")
+        refund = _item_refunds(order, items)[item.pk] if _is_paid(order) else ZERO
+        awaiting_payment = _awaiting_payment(order)
+        _close_items(
+            [item],
+            'cancelled',
+            [(order.user_id, refund, f"Refund for cancelled item {item.product.product_name} from order #{order.order_number}")],
+            restocked=not awaiting_payment,
+        )
+        if awaiting_payment:
+            # Stop holding stock for it; an order has one line per variant
+            StockReservation.objects.filter(order=order, variant_id=item.variant_id).delete()
+    return item, refund
+
+
+def approve_returns(order_return_ids=(), item_return_ids=(), processed_by=None, admin_notes=''):
+    """Approve pending return requests in one transaction, whatever their number.
+
+    Items go back in stock with one bulk update, statuses flip with bulk_update
+    and every refund is written to the wallets in one batch. Requests that were
+    already processed are skipped. Item returns are settled first, so an order
+    return in the same batch only refunds what is left of the order.
+    """
+    with transaction.atomic():
+        order_returns = list(
+            ReturnRequest.objects.select_for_update().filter(pk__in=order_return_ids, status='pending').order_by('pk')
+        )
+        item_returns = list(
+            ItemReturnRequest.objects.select_for_update(of=('self',)).filter(pk__in=item_return_ids, status='pending')
+            .select_related('order_item').order_by('pk')
+        )
+        order_ids = {request.order_id for request in order_returns} | {request.order_item.order_id for request in item_returns}
+        orders = {order.pk: order for order in Order.objects.select_for_update().filter(pk__in=order_ids).order_by('pk')}
+        items_by_order = {}
+        for item in OrderItem.objects.filter(order__in=order_ids).select_related('product').order_by('id'):
+            items_by_order.setdefault(item.order_id, []).append(item)
+
+        now = timezone.now()
+        closing = []
+        credits = []
+        for request in item_returns:
+            order = orders[request.order_item.order_id]
+            items = items_by_order[order.pk]
+            item = next(item for item in items if item.pk == request.order_item_id)
+            if item.status == 'active':
+                refund = _item_refunds(order, items)[item.pk]
+                credits.append((order.user_id, refund, f"Refund for returned item: {item.product.product_name} from order {order.order_number}"))
+                item.status = 'returned'
+                closing.append(item)
+            request.order_item = item
+        for request in order_returns:
+            order = orders[request.order_id]
+            items = items_by_order.get(order.pk, [])
+            credits.append((order.user_id, _order_refund(order, items), f"Refund for returned order {order.order_number}"))
+            closing.extend(item for item in items if item.status == 'active')
+            order.status = 'returned'
+            order.updated_at = now
+            request.order = order
+
+        for request in order_returns + item_returns:
+            request.status = 'approved'
+            request.admin_notes = admin_notes
+            request.processed_at = now
+            request.processed_by = processed_by
+        fields = ['status', 'admin_notes', 'processed_at', 'processed_by']
+        ReturnRequest.objects.bulk_update(order_returns, fields)
+        ItemReturnRequest.objects.bulk_update(item_returns, fields)
+        Order.objects.bulk_update([request.order for request in order_returns], ['status', 'updated_at'])
+        if order_returns:
+            invalidate_dashboard()
+        _close_items(closing, 'returned', credits)
+    return ApprovedReturns(order_returns, item_returns, sum((credit[1] for credit in credits), ZERO))
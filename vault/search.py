@@ -0,0 +1,45 @@
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.db.models import F, Q, FloatField, OuterRef, Subquery
+from django.db.models.functions import Cast
+
+from .models import Category, Product, ProductVariant
+
+SEARCH_CONFIG = 'english'
+
+
+def product_search_vector():
+    """Weighted document for a product row: name, category name, description, then variant colors"""
+    category_name = Subquery(Category.objects.filter(pk=OuterRef('category_id')).values('name')[:1])
+    colors = Subquery(
+        ProductVariant.objects.filter(product=OuterRef('pk'), is_active=True)
+        .values('product').annotate(colors=StringAgg('color', ' ')).values('colors')
+    )
+    return (
+        SearchVector('product_name', weight='A', config=SEARCH_CONFIG) +
+        SearchVector(category_name, weight='B', config=SEARCH_CONFIG) +
+        SearchVector('product_description', weight='C', config=SEARCH_CONFIG) +
+        SearchVector(colors, weight='D', config=SEARCH_CONFIG)
+    )
+
+
+def refresh_search_vectors(products=None):
+    """Rebuild the stored search document for a product queryset with one UPDATE"""
+    if products is None:
+        products = Product.objects.all()
+    return products.order_by().update(search_vector=product_search_vector())
+
+
+def search_products(queryset, query):
+    """Full-text match on the stored vector, with trigram similarity on the name for typos.
+
+    Adds search_rank and name_similarity annotations so callers can order by relevance.
+    """
+    search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+    # Cast from real to double precision so the values round-trip exactly through pagination cursors
+    return queryset.annotate(
+        search_rank=Cast(SearchRank(F('search_vector'), search_query), FloatField()),
+        name_similarity=Cast(TrigramWordSimilarity(query, 'product_name'), FloatField()),
+    ).filter(
+        Q(search_vector=search_query) | Q(product_name__trigram_word_similar=query)
+    )
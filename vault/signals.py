@@ -0,0 +1,129 @@
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import autocomplete
+from .models import CartItem, Category, CategoryOffer, Coupon, Order, Product, ProductReview, ProductVariant, WishlistItem
+from .dashboard import invalidate_dashboard
+from .offers import invalidate_offer_caches, bump_cache_version, CATALOG_VERSION_KEY
+from .inventory import refresh_stock_summaries
+from .nav_counts import invalidate_nav_counts
+from .pricing import refresh_effective_prices
+from .ratings import apply_rating_change, rebuild_rating_summaries
+from .search import refresh_search_vectors
+
+
+@receiver(post_save, sender=CategoryOffer)
+@receiver(post_delete, sender=CategoryOffer)
+def reprice_offer_category(sender, instance, **kwargs):
+    """Reprice products of the offer's category and any product still pointing at the offer"""
+    refresh_effective_prices(
+        Product.objects.filter(Q(category_id=instance.category_id) | Q(applied_category_offer_id=instance.id))
+    )
+    invalidate_offer_caches(catalog=True, coupons=False)
+
+
+@receiver(post_save, sender=Category)
+def reprice_category(sender, instance, created, **kwargs):
+    if not created:
+        refresh_effective_prices(Product.objects.filter(category=instance))
+        refresh_search_vectors(Product.objects.filter(category=instance))
+    bump_cache_version(CATALOG_VERSION_KEY)
+
+
+@receiver(post_save, sender=Coupon)
+@receiver(post_delete, sender=Coupon)
+def coupon_changed(sender, instance, **kwargs):
+    invalidate_offer_caches(catalog=False, coupons=True)
+
+
+@receiver(post_save, sender=Product)
+def reindex_product(sender, instance, **kwargs):
+    refresh_search_vectors(Product.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def reindex_variant_product(sender, instance, **kwargs):
+    refresh_search_vectors(Product.objects.filter(pk=instance.product_id))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def catalog_changed(sender, instance, **kwargs):
+    bump_cache_version(CATALOG_VERSION_KEY)
+
+
+@receiver(post_save, sender=Product)
+def index_product_suggestions(sender, instance, **kwargs):
+    autocomplete.sync_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product_suggestions(sender, instance, **kwargs):
+    autocomplete.sync_product(instance, deleted=True)
+
+
+@receiver(post_save, sender=ProductVariant)
+def index_variant_suggestions(sender, instance, **kwargs):
+    autocomplete.sync_variant(instance)
+
+
+@receiver(post_delete, sender=ProductVariant)
+def unindex_variant_suggestions(sender, instance, **kwargs):
+    autocomplete.sync_variant(instance, deleted=True)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def reindex_category_suggestions(sender, instance, **kwargs):
+    autocomplete.sync_category(instance)
+
+
+@receiver(post_save, sender=ProductReview)
+def review_saved(sender, instance, created, **kwargs):
+    if created:
+        apply_rating_change(instance.product_id, new_rating=instance.rating)
+    elif hasattr(instance, '_stored_rating'):
+        apply_rating_change(instance.product_id, instance._stored_rating, instance.rating)
+    else:
+        # Saved without being loaded first, so the previous rating is unknown
+        rebuild_rating_summaries(Product.objects.filter(pk=instance.product_id))
+    instance._stored_rating = instance.rating
+
+
+@receiver(post_delete, sender=ProductReview)
+def review_deleted(sender, instance, **kwargs):
+    apply_rating_change(instance.product_id, old_rating=getattr(instance, '_stored_rating', instance.rating))
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def restock_summary(sender, instance, **kwargs):
+    refresh_stock_summaries(Product.objects.filter(pk=instance.product_id))
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def cart_changed(sender, instance, **kwargs):
+    invalidate_nav_counts(instance.cart.user_id)
+
+
+@receiver(post_save, sender=WishlistItem)
+@receiver(post_delete, sender=WishlistItem)
+def wishlist_changed(sender, instance, **kwargs):
+    invalidate_nav_counts(instance.wishlist.user_id)
+
+
+@receiver(post_save, sender=Order)
+def order_status_changed(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None:
+        changed = 'status' in update_fields
+    else:
+        # A full save only counts when the status differs from what was loaded
+        changed = created or getattr(instance, '_stored_status', None) != instance.status
+    if changed:
+        invalidate_dashboard()
+    instance._stored_status = instance.status
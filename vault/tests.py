@@ -1 +1,508 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+import random
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection, transaction
+from django.template.loader import render_to_string
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .autocomplete import PrefixIndex
+from .coupons import get_available_coupons, redeem_coupon
+from .inventory import InsufficientStock, restock, take_stock
+from .models import (
+    Address, Cart, CartItem, Category, Coupon, CouponUsage, Order, PaymentEvent, Product, ProductReview, ProductVariant, User, VariantImage,
+    Wallet,
+)
+from .money import (
+    allocate, apply_percentages, from_paise, line_total, sum_lines, to_money, to_paise,
+)
+from .offers import CATALOG_VERSION_KEY, get_cache_version, invalidate_offer_caches
+from .order_numbers import next_order_number, next_order_numbers
+from .orders import (
+    EXPIRED_REASON, OrderPlacementError, create_pending_online_order, expire_abandoned_orders, place_order, quote_cart,
+)
+from .pagination import CursorPaginator, encode_cursor
+from .payment_events import process_pending_events
+from .pricing import shipping_for
+
+
+def make_user(email, **extra):
+    return User.objects.create_user(email, full_name=email.split('@')[0], **extra)
+
+
+def make_address(user):
+    return Address.objects.create(
+        user=user, full_name=user.full_name, phone_number='9999999999',
+        address_line_1='1 Test Street', city='Kochi', state='Kerala', postal_code='682001'
+    )
+
+
+def make_variant(name='Test Watch', price=1000, stock=5, category=None):
+    category = category or Category.objects.create(name=f"{name} watches")
+    product = Product.objects.create(category=category, product_name=name, price=price)
+    return ProductVariant.objects.create(product=product, color='black', stock_quantity=stock)
+
+
+def fill_cart(user, variant, quantity=1):
+    cart, _ = Cart.objects.get_or_create(user=user)
+    CartItem.objects.create(cart=cart, product=variant.product, variant=variant, quantity=quantity)
+    return cart
+
+
+def run_concurrently(target, args_list):
+    """Run target(*args) in one thread per args, released together; returns (results, errors)"""
+    barrier = threading.Barrier(len(args_list))
+    lock = threading.Lock()
+    results, errors = [], []
+
+    def worker(*args):
+        try:
+            barrier.wait()
+            result = target(*args)
+            with lock:
+                results.append(result)
+        except Exception as e:
+            with lock:
+                errors.append(repr(e))
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=args) for args in args_list]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+@override_settings(RAZORPAY_WEBHOOK_SECRET='whsec')
+class LatePaymentWebhookTests(TestCase):
+    def setUp(self):
+        self.user = make_user('late@example.com')
+        variant = make_variant(stock=3)
+        cart = fill_cart(self.user, variant)
+        self.order = create_pending_online_order(self.user, make_address(self.user), quote_cart(self.user, cart), 'order_late')
+
+    def post_capture(self, payment_id='pay_late'):
+        body = json.dumps({
+            'event': 'payment.captured',
+            'payload': {'payment': {'entity': {
+                'id': payment_id, 'order_id': 'order_late', 'status': 'captured',
+                'amount': to_paise(self.order.total_amount),
+            }}},
+        }).encode()
+        signature = hmac.new(b'whsec', body, hashlib.sha256).hexdigest()
+        return self.client.post(
+            reverse('razorpay_webhook'), body, content_type='application/json',
+            HTTP_X_RAZORPAY_SIGNATURE=signature,
+        )
+
+    def test_capture_after_expiry_refunds_to_wallet(self):
+        self.assertEqual(expire_abandoned_orders(older_than=timedelta(0)), 1)
+
+        self.assertTrue(self.post_capture().json()['success'])
+        process_pending_events()
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'cancelled')
+        self.assertEqual(self.order.cancellation_reason, EXPIRED_REASON)
+        self.assertEqual(self.order.razorpay_payment_id, 'pay_late')
+        self.assertEqual(Wallet.objects.get(user=self.user).balance, self.order.total_amount)
+        self.assertEqual(PaymentEvent.objects.get().status, 'processed')
+
+    def test_redelivered_capture_refunds_once(self):
+        expire_abandoned_orders(older_than=timedelta(0))
+
+        self.post_capture()
+        process_pending_events()
+        self.post_capture(payment_id='pay_late_again')
+        process_pending_events()
+
+        self.assertEqual(Wallet.objects.get(user=self.user).balance, self.order.total_amount)
+
+
+class DashboardInvalidationTests(TestCase):
+    def setUp(self):
+        user = make_user('dashboard@example.com')
+        cart = fill_cart(user, make_variant())
+        self.order = create_pending_online_order(user, make_address(user), quote_cart(user, cart), 'order_dash')
+        self.order = Order.objects.get(pk=self.order.pk)
+
+    def invalidations(self, save):
+        with mock.patch('vault.signals.invalidate_dashboard') as invalidate:
+            save(self.order)
+        return invalidate.call_count
+
+    def test_full_save_without_a_status_change_keeps_the_dashboard(self):
+        def retry(order):
+            order.razorpay_order_id = 'order_dash_retry'
+            order.save()
+
+        self.assertEqual(self.invalidations(retry), 0)
+
+    def test_status_changes_invalidate_the_dashboard(self):
+        def confirm(order):
+            order.status = 'confirmed'
+            order.save()
+
+        self.assertEqual(self.invalidations(confirm), 1)
+        self.assertEqual(self.invalidations(lambda order: order.save(update_fields=['status'])), 1)
+        self.assertEqual(self.invalidations(lambda order: order.save(update_fields=['updated_at'])), 0)
+
+
+class StockFacetInvalidationTests(TestCase):
+    def setUp(self):
+        self.variant = make_variant(stock=2)
+
+    def catalog_version_after(self, change):
+        before = get_cache_version(CATALOG_VERSION_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                change()
+        return get_cache_version(CATALOG_VERSION_KEY) - before
+
+    def test_selling_out_and_restocking_drop_cached_facets(self):
+        self.assertEqual(self.catalog_version_after(lambda: take_stock([(self.variant.pk, 1)])), 0)
+        self.assertEqual(self.catalog_version_after(lambda: take_stock([(self.variant.pk, 1)])), 1)
+        self.assertEqual(self.catalog_version_after(lambda: restock([(self.variant.pk, 1)])), 1)
+        self.assertEqual(self.catalog_version_after(lambda: restock([(self.variant.pk, 1)])), 0)
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    buyers = 12
+
+    def checkout(self, user, address):
+        try:
+            place_order(user, address, 'cod')
+        except (InsufficientStock, OrderPlacementError):
+            return 'sold_out'
+        return 'placed'
+
+    def race_for(self, stock):
+        variant = make_variant(stock=stock)
+        buyers = []
+        for i in range(self.buyers):
+            user = make_user(f"buyer{i}@example.com")
+            fill_cart(user, variant)
+            buyers.append((user, make_address(user)))
+
+        results, errors = run_concurrently(self.checkout, buyers)
+
+        self.assertEqual(errors, [])
+        variant.refresh_from_db()
+        variant.product.refresh_from_db()
+        return variant, results
+
+    def test_last_unit_sells_once(self):
+        variant, results = self.race_for(stock=1)
+
+        self.assertEqual(results.count('placed'), 1)
+        self.assertEqual(Order.objects.filter(items__variant=variant).count(), 1)
+        self.assertEqual(variant.stock_quantity, 0)
+        self.assertEqual(variant.product.total_stock, 0)
+        self.assertFalse(variant.product.is_in_stock)
+
+    def test_low_stock_is_never_oversold(self):
+        variant, results = self.race_for(stock=5)
+
+        self.assertEqual(results.count('placed'), 5)
+        self.assertEqual(results.count('sold_out'), self.buyers - 5)
+        self.assertEqual(variant.stock_quantity, 0)
+        self.assertEqual(variant.product.total_stock, 0)
+
+
+class OrderNumberTests(TransactionTestCase):
+    threads = 8
+    per_thread = 50
+
+    def test_numbers_are_unique_and_increase_per_caller(self):
+        single = [next_order_number() for _ in range(100)]
+        bulk = next_order_numbers(200)
+        issued, errors = run_concurrently(
+            lambda: [next_order_number() for _ in range(self.per_thread)], [()] * self.threads
+        )
+
+        self.assertEqual(errors, [])
+        for numbers in [single, bulk] + issued:
+            self.assertEqual(numbers, sorted(numbers))
+        everything = single + bulk + [number for numbers in issued for number in numbers]
+        self.assertEqual(len(set(everything)), 100 + 200 + self.threads * self.per_thread)
+        self.assertLessEqual(max(len(number) for number in everything), Order._meta.get_field('order_number').max_length)
+        self.assertEqual(next_order_numbers(0), [])
+
+
+class ProductDetailQueryTests(TestCase):
+    colors = ['black', 'blue', 'red', 'green', 'white', 'navy']
+
+    def setUp(self):
+        self.client.force_login(make_user('shopper@example.com'))
+
+    def make_product(self, name, variants):
+        category = Category.objects.create(name=f"{name} watches")
+        product = Product.objects.create(category=category, product_name=name, price=2500)
+        for i, color in enumerate(self.colors[:variants]):
+            variant = ProductVariant.objects.create(product=product, color=color, stock_quantity=i + 1)
+            VariantImage.objects.create(variant=variant, image=f'variant_images/{name}-{color}.jpg', is_primary=True)
+            reviewer = make_user(f"{name}-reviewer{i}@example.com")
+            ProductReview.objects.create(product=product, user=reviewer, rating=i % 5 + 1, review_text='Keeps time')
+        related = Product.objects.create(category=category, product_name=f"{name} related", price=900)
+        ProductVariant.objects.create(product=related, color='black', stock_quantity=1)
+        return product
+
+    def render(self, product):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('products_details', args=[product.pk]))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_variants_or_reviews(self):
+        single = self.make_product('Solo', variants=1)
+        many = self.make_product('Chrono', variants=len(self.colors))
+        self.render(single)  # warm caches shared by every page
+
+        expected = self.render(single)
+        with self.assertNumQueries(expected):
+            self.client.get(reverse('products_details', args=[many.pk]))
+
+
+class TamperedCursorTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Cursor watches')
+        self.products = [
+            Product.objects.create(category=category, product_name=f"Watch {i}", price=1000 + i) for i in range(5)
+        ]
+
+    def paginate(self, ordering):
+        return CursorPaginator(Product.objects.all(), per_page=2, ordering=ordering, count=None)
+
+    def assertFirstPage(self, page, ordering):
+        self.assertEqual(list(page.object_list), list(self.paginate(ordering).page().object_list))
+        self.assertFalse(page.has_previous())
+
+    def test_cursor_from_another_sort_gives_the_first_page(self):
+        cursor = self.paginate(('product_name', 'id')).page().next_cursor
+
+        page = self.paginate(('-created_at', '-id')).page(cursor)
+
+        self.assertFirstPage(page, ('-created_at', '-id'))
+
+    def test_wrongly_typed_cursor_values_give_the_first_page(self):
+        ordering = ('-created_at', '-id')
+        for values in (['Watch 1', self.products[1].pk], [None, 'abc'], [{'dec': '1.5'}, [1]]):
+            with self.subTest(values=values):
+                page = self.paginate(ordering).page(encode_cursor('next', values, ','.join(ordering)))
+                self.assertFirstPage(page, ordering)
+
+    def test_product_list_ignores_a_cursor_from_another_sort(self):
+        self.client.force_login(make_user('browser@example.com'))
+        cursor = self.paginate(('product_name', 'id')).page().next_cursor
+
+        response = self.client.get(reverse('products_list'), {'sort': 'newest', 'cursor': cursor})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['products'].has_previous())
+
+
+class AutocompleteTests(TestCase):
+    def loaded_index(self):
+        index = PrefixIndex()
+        index.load([(1, 'Dive Watches')], [(1, 'Omega Seamaster')], [], version=1)
+        return index
+
+    def test_stale_index_serves_while_it_rebuilds(self):
+        index = self.loaded_index()
+        started, release = threading.Event(), threading.Event()
+
+        def slow_build():
+            started.set()
+            release.wait(5)
+
+        with mock.patch.object(index, 'build', side_effect=slow_build) as build:
+            index.invalidate()
+            index.ensure_fresh()
+            self.assertTrue(started.wait(5))
+            self.assertEqual(index.suggest('sea'), [('product', 1, 'Omega Seamaster')])
+            index.ensure_fresh()  # already rebuilding
+            release.set()
+
+        self.assertEqual(build.call_count, 1)
+
+    def test_updates_swap_the_arrays_readers_hold(self):
+        index = self.loaded_index()
+        entries, labels = index._entries, index._labels
+
+        index.put('product', 2, 'Seiko Presage')
+        index.discard('product', 1)
+
+        self.assertEqual(entries, sorted(entries))
+        self.assertIn(('seamaster', 'product', 1), entries)
+        self.assertEqual(labels[('product', 1)], 'Omega Seamaster')
+        self.assertEqual(index.suggest('se'), [('product', 2, 'Seiko Presage')])
+
+    def test_suggestions_need_a_login(self):
+        response = self.client.get(reverse('product_suggestions'), {'q': 'om'})
+
+        self.assertEqual(response.status_code, 302)
+
+    def test_search_box_only_suggests_for_signed_in_shoppers(self):
+        def navigation_for(user):
+            request = RequestFactory().get('/')
+            request.user = user
+            return render_to_string('navigation.html', request=request)
+
+        suggest_url = reverse('product_suggestions')
+        self.assertNotIn(suggest_url, navigation_for(AnonymousUser()))
+        self.assertIn(suggest_url, navigation_for(make_user('searcher@example.com')))
+
+
+class MoneyPropertyTests(SimpleTestCase):
+    """Randomized checks over generated carts; the seed is fixed so failures reproduce"""
+    examples = 2000
+
+    def setUp(self):
+        self.rng = random.Random(20261016)
+
+    def random_cart(self):
+        prices = [self.rng.randint(1, 200000) for _ in range(self.rng.randint(1, 12))]
+        quantities = [self.rng.randint(1, 10) for _ in prices]
+        offer = self.rng.choice([0, 5, 10, 12.5, 33.33, self.rng.uniform(0, 90)])
+        return apply_percentages(prices, offer), quantities
+
+    def random_coupon(self):
+        return Coupon(
+            discount_type=self.rng.choice(['percentage', 'fixed']),
+            discount_value=to_money(self.rng.uniform(1, 6000)),
+            maximum_discount=self.rng.choice([None, to_money(self.rng.uniform(50, 5000))]),
+        )
+
+    def test_allocate_sums_exactly(self):
+        for _ in range(self.examples):
+            weights = [to_money(self.rng.uniform(0.01, 50000)) for _ in range(self.rng.randint(1, 12))]
+            amount = to_money(self.rng.uniform(0, float(sum(weights))))
+            with self.subTest(amount=amount, weights=weights):
+                shares = allocate(amount, weights)
+                self.assertEqual(sum(shares), amount)
+                self.assertTrue(all(share >= 0 and share == to_money(share) for share in shares))
+
+    def test_paise_rounding_is_half_up(self):
+        self.assertEqual(to_money(Decimal('2.675')), Decimal('2.68'))
+        self.assertEqual(to_money(1.005), Decimal('1.01'))
+        for _ in range(self.examples):
+            paise = self.rng.randint(0, 10 ** 8)
+            rupees = Decimal(paise) / 100
+            with self.subTest(paise=paise):
+                self.assertEqual(to_money(rupees + Decimal('0.005')), rupees + Decimal('0.01'))
+                self.assertEqual(to_money(rupees + Decimal('0.0049')), rupees)
+                self.assertEqual(to_paise(rupees + Decimal('0.005')), paise + 1)
+                self.assertEqual(from_paise(paise), rupees)
+
+    def test_coupon_discount_never_exceeds_subtotal(self):
+        for _ in range(self.examples):
+            unit_prices, quantities = self.random_cart()
+            subtotal = sum_lines(zip(unit_prices, quantities))
+            coupon = self.random_coupon()
+            with self.subTest(subtotal=subtotal, coupon=(coupon.discount_type, coupon.discount_value, coupon.maximum_discount)):
+                discount = coupon.calculate_discount(subtotal)
+                self.assertTrue(Decimal('0') <= discount <= subtotal)
+                self.assertEqual(discount, to_money(discount))
+
+    def test_gateway_amount_adds_up_from_the_lines(self):
+        for _ in range(self.examples):
+            unit_prices, quantities = self.random_cart()
+            subtotal = sum_lines(zip(unit_prices, quantities))
+            discount = self.random_coupon().calculate_discount(subtotal)
+            shipping = shipping_for(subtotal - discount)
+            total = subtotal - discount + shipping
+            with self.subTest(unit_prices=unit_prices, quantities=quantities):
+                lines_paise = sum(to_paise(line_total(price, quantity)) for price, quantity in zip(unit_prices, quantities))
+                self.assertEqual(to_paise(total), lines_paise - to_paise(discount) + to_paise(shipping))
+                self.assertEqual(from_paise(to_paise(total)), total)
+
+
+class CouponEligibilityQueryTests(TestCase):
+    coupons = 200
+
+    def setUp(self):
+        rng = random.Random(42)
+        now = timezone.now()
+        self.user = make_user('coupons@example.com')
+        coupons = Coupon.objects.bulk_create([
+            Coupon(
+                code=f"BULK{i}", discount_type=rng.choice(['percentage', 'fixed']), discount_value=rng.randint(5, 40),
+                minimum_amount=rng.choice([0, 500, 1000, 5000, 20000]), usage_limit=rng.choice([None, 1, 10, 100]),
+                valid_from=now - timedelta(days=1), valid_until=now + timedelta(days=rng.randint(1, 30)),
+            )
+            for i in range(self.coupons)
+        ])
+        # Some already redeemed by the shopper, some used up by others
+        self.redeemed = set(rng.sample(coupons, len(coupons) // 10))
+        other = make_user('other@example.com')
+        self.used_up = {coupon for coupon in coupons if coupon.usage_limit == 1} - self.redeemed
+        CouponUsage.objects.bulk_create(
+            [CouponUsage(user=self.user, coupon=coupon) for coupon in self.redeemed]
+            + [CouponUsage(user=other, coupon=coupon) for coupon in self.used_up]
+        )
+        invalidate_offer_caches(catalog=False, coupons=True)
+
+    def test_lookup_takes_two_queries_whatever_the_coupon_count(self):
+        get_available_coupons(self.user, Decimal('100'))  # loads the cached candidates
+
+        for cart_total in (Decimal('100'), Decimal('4999'), Decimal('50000')):
+            with self.subTest(cart_total=cart_total), self.assertNumQueries(2):
+                results = get_available_coupons(self.user, cart_total)
+
+        offered = {result['coupon'].pk for result in results}
+        self.assertEqual(len(offered), self.coupons - len(self.redeemed | self.used_up))
+        self.assertFalse(offered & {coupon.pk for coupon in self.redeemed | self.used_up})
+
+
+class ConcurrentCouponRedemptionTests(TransactionTestCase):
+    def make_coupon(self, usage_limit):
+        now = timezone.now()
+        return Coupon.objects.create(
+            code='RACE', discount_type='fixed', discount_value=100, usage_limit=usage_limit,
+            valid_from=now - timedelta(hours=1), valid_until=now + timedelta(hours=1),
+        )
+
+    def race(self, coupon, redeemers, attempts=2):
+        def redeem(user):
+            wins = 0
+            for _ in range(attempts):
+                with transaction.atomic():
+                    wins += redeem_coupon(coupon.pk, user)
+            return wins
+
+        users = [make_user(f"redeemer{i}@example.com") for i in range(redeemers)]
+        results, errors = run_concurrently(redeem, [(user,) for user in users])
+        self.assertEqual(errors, [])
+        coupon.refresh_from_db()
+        return sum(results)
+
+    def test_usage_never_exceeds_the_limit(self):
+        coupon = self.make_coupon(usage_limit=5)
+
+        wins = self.race(coupon, redeemers=16)
+
+        usages = CouponUsage.objects.filter(coupon=coupon)
+        self.assertEqual(wins, 5)
+        self.assertEqual(coupon.used_count, 5)
+        self.assertEqual(usages.count(), 5)
+        self.assertEqual(usages.values('user').distinct().count(), 5)
+
+    def test_each_user_redeems_an_unlimited_coupon_once(self):
+        coupon = self.make_coupon(usage_limit=None)
+
+        wins = self.race(coupon, redeemers=8)
+
+        self.assertEqual(wins, 8)
+        self.assertEqual(coupon.used_count, 8)
+        self.assertEqual(CouponUsage.objects.filter(coupon=coupon).count(), 8)
@@ -20,6 +20,7 @@ urlpatterns = [
     path('resend-reset-otp/', resend_reset_otp, name='resend_reset_otp'),
     
     path('products/', product_list, name='products_list'),
+    path('products/suggest/', product_suggestions, name='product_suggestions'),
     path('product/<int:product_id>/', product_detail_page, name='products_details'),
     
     path('profile/', user_profile, name='user_profile'),
@@ -48,6 +49,7 @@ urlpatterns = [
     path('payment-failure/<int:order_id>/', payment_failure, name='payment_failure'),
     
     path('verify-payment/', verify_payment, name='verify_payment'),
+    path('razorpay/webhook/', razorpay_webhook, name='razorpay_webhook'),
     path('place-order/', place_order, name='place_order'),
     path('retry-payment/<int:order_id>/', retry_payment, name='retry_payment'),
     path('order-success/<int:order_id>/', order_success, name='order_success'),
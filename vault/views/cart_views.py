@@ -1,4 +1,6 @@
 from .common_imports import *
+from ..nav_counts import get_nav_counts
+from ..pricing import CartPricer
 
 @never_cache
 @login_required
@@ -10,33 +12,22 @@ def cart_view(request):
         return redirect('front')
     
     cart, created = Cart.objects.get_or_create(user=request.user)
-    cart_items = cart.items.select_related('product', 'variant').prefetch_related('variant__images')
-    
-    total_price = 0
-    available_items = []
-    unavailable_items = []
-    
-    for item in cart_items:
-        item.unit_price = item.get_unit_price()
-        item.total_price = item.get_total_price()
-        if item.is_available():
-            available_items.append(item)
-            total_price += item.total_price
-        else:
-            unavailable_items.append(item)
+    pricer = CartPricer(request.user)
+    pricing = pricer.price(cart, pricer.load_items(cart, prefetch_images=True), coupon=None)
     
     context = {
         'cart': cart,
-        'available_items': available_items,
-        'unavailable_items': unavailable_items,
-        'total_price': total_price,
-        'total_items': len(available_items),
+        'available_items': [line.item for line in pricing.lines],
+        'unavailable_items': pricing.unavailable_items,
+        'total_price': pricing.subtotal,
+        'total_items': len(pricing.lines),
     }
     
     return render(request, 'cart/cart.html', context)
 
 @login_required
 @require_POST
+@idempotent
 def add_to_cart(request):
     if check_user_blocked(request.user):
         return JsonResponse({
@@ -77,10 +68,11 @@ def add_to_cart(request):
                 'message': 'This product is no longer available.'
             })
         
-        if variant.stock_quantity < quantity:
+        available_stock = variant.get_available_stock(exclude_user=request.user.pk)
+        if available_stock < quantity:
             return JsonResponse({
                 'success': False,
-                'message': f'Only {variant.stock_quantity} items available in stock.'
+                'message': f'Only {available_stock} items available in stock.'
             })
         
         cart, created = Cart.objects.get_or_create(user=request.user)
@@ -94,10 +86,10 @@ def add_to_cart(request):
         
         if not item_created:
             new_quantity = cart_item.quantity + quantity
-            if new_quantity > variant.stock_quantity:
+            if new_quantity > available_stock:
                 return JsonResponse({
                     'success': False,
-                    'message': f'Cannot add more items. Only {variant.stock_quantity} available, {cart_item.quantity} already in cart.'
+                    'message': f'Cannot add more items. Only {available_stock} available, {cart_item.quantity} already in cart.'
                 })
             if new_quantity > 10:
                 return JsonResponse({
@@ -119,12 +111,10 @@ def add_to_cart(request):
         except Wishlist.DoesNotExist:
             pass
         
-        cart_total = cart.get_total_items()
-        
         return JsonResponse({
             'success': True,
             'message': f'{product.product_name} added to cart successfully!',
-            'cart_total': cart_total,
+            'cart_total': get_nav_counts(request.user)['cart'],
             'item_quantity': cart_item.quantity,
         })
     
@@ -160,12 +150,11 @@ def update_cart_quantity(request):
                 'message': 'Invalid request parameters.'
             })
         
-        try:
-            cart_item = CartItem.objects.get(
-                id=cart_item_id,
-                cart__user=request.user
-            )
-        except CartItem.DoesNotExist:
+        cart = Cart.objects.filter(user=request.user).first()
+        pricer = CartPricer(request.user)
+        items = pricer.load_items(cart) if cart else []
+        cart_item = next((item for item in items if str(item.id) == str(cart_item_id)), None)
+        if cart_item is None:
             return JsonResponse({
                 'success': False,
                 'message': 'Cart item not found.'
@@ -188,10 +177,11 @@ def update_cart_quantity(request):
                 'message': 'Quantity must be at least 1.'
             })
         
-        if new_quantity > cart_item.variant.stock_quantity:
+        available_stock = cart_item.get_available_stock()
+        if new_quantity > available_stock:
             return JsonResponse({
                 'success': False,
-                'message': f'Only {cart_item.variant.stock_quantity} items available in stock.'
+                'message': f'Only {available_stock} items available in stock.'
             })
         
         if new_quantity > 10:
@@ -201,18 +191,17 @@ def update_cart_quantity(request):
             })
         
         cart_item.quantity = new_quantity
-        cart_item.save()
+        cart_item.save(update_fields=['quantity', 'updated_at'])
         
-        item_total = cart_item.get_total_price()
-        cart_total = cart_item.cart.get_total_price()
-        cart_items_count = cart_item.cart.get_total_items()
+        # Reprice the lines already loaded instead of querying the cart again
+        pricing = pricer.price(cart, items, coupon=None)
         
         return JsonResponse({
             'success': True,
             'quantity': new_quantity,
-            'item_total': float(item_total),
-            'cart_total': float(cart_total),
-            'cart_items_count': cart_items_count,
+            'item_total': float(cart_item.total_price),
+            'cart_total': float(pricing.subtotal),
+            'cart_items_count': sum(item.quantity for item in items),
         })
     
     except json.JSONDecodeError:
@@ -246,22 +235,22 @@ def remove_from_cart(request):
             })
         
         try:
-            cart_item = CartItem.objects.get(
+            cart_item = CartItem.objects.select_related('product', 'cart').get(
                 id=cart_item_id,
                 cart__user=request.user
             )
             product_name = cart_item.product.product_name
             cart_item.delete()
             
-            cart = Cart.objects.get(user=request.user)
-            cart_total = cart.get_total_price()
-            cart_items_count = cart.get_total_items()
+            pricer = CartPricer(request.user)
+            items = pricer.load_items(cart_item.cart)
+            pricing = pricer.price(cart_item.cart, items, coupon=None)
             
             return JsonResponse({
                 'success': True,
                 'message': f'{product_name} removed from cart.',
-                'cart_total': float(cart_total),
-                'cart_items_count': cart_items_count,
+                'cart_total': float(pricing.subtotal),
+                'cart_items_count': sum(item.quantity for item in items),
             })
         except CartItem.DoesNotExist:
             return JsonResponse({
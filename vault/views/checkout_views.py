@@ -1,4 +1,10 @@
 from .common_imports import *
+from ..inventory import InsufficientStock
+from ..orders import OrderPlacementError, quote_cart, create_pending_online_order, confirm_online_payment, renew_reservation
+from ..payment_events import verify_webhook_signature, record_event
+from ..coupons import get_available_coupons
+from ..money import to_paise
+from ..pricing import CartPricer
 
 @never_cache
 @login_required
@@ -10,53 +16,40 @@ def checkout(request):
         return redirect('front')
     
     try:
-        cart = Cart.objects.get(user=request.user)
-        cart_items = cart.items.select_related('product', 'variant').prefetch_related('variant__images')
-        available_items = [item for item in cart_items if item.is_available()]
+        cart = Cart.objects.select_related('applied_coupon').get(user=request.user)
+        pricer = CartPricer(request.user)
+        pricing = pricer.price(cart, pricer.load_items(cart, prefetch_images=True))
         
-        if not available_items:
+        if not pricing.lines:
             messages.warning(request, "Your cart is empty or contains unavailable items.")
             return redirect('cart_view')
         
-        subtotal = sum(item.get_total_price() for item in available_items)
-        
-        # Calculate coupon discount
-        coupon_discount = Decimal('0.00')
-        applied_coupon = None
-        if cart.applied_coupon:
-            applied_coupon = cart.applied_coupon
-            is_valid, message = applied_coupon.is_valid(request.user, subtotal)
-            if is_valid:
-                coupon_discount = applied_coupon.calculate_discount(subtotal)
-            else:
-                # Remove invalid coupon
-                cart.applied_coupon = None
-                cart.save()
-                messages.warning(request, f"Coupon removed: {message}")
-        
-        # Calculate shipping and total
-        discounted_subtotal = float(subtotal) - float(coupon_discount)
-        shipping_charge = Decimal('50.00') if discounted_subtotal < 500 else Decimal('0.00')
-        total_amount = float(discounted_subtotal) + float(shipping_charge)
+        if pricing.coupon_error:
+            # Remove invalid coupon
+            cart.applied_coupon = None
+            cart.save()
+            messages.warning(request, f"Coupon removed: {pricing.coupon_error}")
+        
+        subtotal = pricing.subtotal
         
         addresses = request.user.addresses.all()
         default_address = addresses.filter(is_default=True).first()
         
         # Check if Razorpay is properly configured
-        razorpay_enabled = razorpay_client is not None
+        razorpay_enabled = get_gateway() is not None
         
         # Get available coupons for the user
         available_coupons = get_available_coupons(request.user, subtotal)
         
         context = {
-            'cart_items': available_items,
+            'cart_items': [line.item for line in pricing.lines],
             'addresses': addresses,
             'default_address': default_address,
             'subtotal': subtotal,
-            'coupon_discount': coupon_discount,
-            'applied_coupon': applied_coupon,
-            'shipping_charge': shipping_charge,
-            'total_amount': total_amount,
+            'coupon_discount': pricing.coupon_discount,
+            'applied_coupon': pricing.coupon,
+            'shipping_charge': pricing.shipping_charge,
+            'total_amount': pricing.total_amount,
             'razorpay_key_id': getattr(settings, 'RAZORPAY_KEY_ID', ''),
             'razorpay_enabled': razorpay_enabled,
             'available_coupons': available_coupons,
@@ -69,6 +62,7 @@ def checkout(request):
     
 @login_required
 @require_POST
+@idempotent
 def create_razorpay_order(request):
     if check_user_blocked(request.user):
         return JsonResponse({
@@ -76,7 +70,8 @@ def create_razorpay_order(request):
             'message': 'Your account has been temporarily blocked.'
         })
     
-    if not razorpay_client:
+    gateway = get_gateway()
+    if gateway is None:
         return JsonResponse({
             'success': False,
             'message': 'Payment gateway is not properly configured. Please contact support.'
@@ -102,87 +97,46 @@ def create_razorpay_order(request):
         
         try:
             cart = Cart.objects.get(user=request.user)
-            cart_items = cart.items.select_related('product', 'variant')
+            quote = quote_cart(request.user, cart)
         except Cart.DoesNotExist:
             return JsonResponse({
                 'success': False,
                 'message': 'Cart is empty.'
             })
-        
-        available_items = [item for item in cart_items if item.is_available()]
-        if not available_items:
+        except OrderPlacementError as e:
             return JsonResponse({
                 'success': False,
-                'message': 'No available items in cart.'
+                'message': str(e)
             })
-        
-        subtotal = sum(item.get_total_price() for item in available_items)
-        
-        # Handle coupon discount
-        coupon_discount = Decimal('0.00')
-        applied_coupon = None
-        if cart.applied_coupon:
-            applied_coupon = cart.applied_coupon
-            is_valid, message = applied_coupon.is_valid(request.user, subtotal)
-            if is_valid:
-                coupon_discount = applied_coupon.calculate_discount(subtotal)
-            else:
-                cart.applied_coupon = None
-                cart.save()
-        
-        discounted_subtotal = float(subtotal) - float(coupon_discount)
-        shipping_charge = Decimal('50.00') if discounted_subtotal < 500 else Decimal('0.00')
-        total_amount = float(discounted_subtotal) + float(shipping_charge)
+        total_amount = quote.total_amount
         
         # Create Razorpay order with error handling
         try:
-            razorpay_order = razorpay_client.order.create({
-                'amount': int(total_amount * 100),  # Amount in paise
-                'currency': 'INR',
-                'payment_capture': 1
-            })
+            razorpay_order = gateway.create_order(to_paise(total_amount))
             logger.info(f"Razorpay order created: {razorpay_order['id']}")
-        except Exception as e:
-            logger.error(f"Failed to create Razorpay order: {e}")
+        except GatewayError as e:
             return JsonResponse({
                 'success': False,
-                'message': 'Failed to create payment order. Please try again or contact support.'
+                'message': str(e)
             })
         
-        # Create order in database
-        order_number = f"ORD{timezone.now().strftime('%Y%m%d%H%M%S')}{random.randint(100, 999)}"
-        order = Order.objects.create(
-            user=request.user,
-            order_number=order_number,
-            subtotal=subtotal,
-            coupon=applied_coupon,
-            coupon_discount=coupon_discount,
-            shipping_charge=shipping_charge,
-            total_amount=total_amount,
-            payment_method='online',
-            shipping_address=address,
-            status='pending',
-            razorpay_order_id=razorpay_order['id']
-        )
-        
-        # Create order items
-        for cart_item in available_items:
-            OrderItem.objects.create(
-                order=order,
-                product=cart_item.product,
-                variant=cart_item.variant,
-                quantity=cart_item.quantity,
-                price=cart_item.get_unit_price()
-            )
+        # Create order in database and hold its stock while the customer pays
+        try:
+            order = create_pending_online_order(request.user, address, quote, razorpay_order['id'])
+        except InsufficientStock as e:
+            return JsonResponse({
+                'success': False,
+                'message': str(e)
+            })
         
         return JsonResponse({
             'success': True,
             'razorpay_order_id': razorpay_order['id'],
             'order_id': order.id,
-            'amount': int(total_amount * 100),
+            'amount': to_paise(total_amount),
             'currency': 'INR',
             'name': 'AZRION',
-            'description': f'Order #{order_number}',
+            'description': f'Order #{order.order_number}',
             'prefill': {
                 'name': request.user.full_name,
                 'email': request.user.email,
@@ -225,6 +179,7 @@ def payment_failure(request, order_id):
 @csrf_exempt
 @login_required
 @require_POST
+@idempotent
 def verify_payment(request):
     if check_user_blocked(request.user):
         return JsonResponse({
@@ -232,7 +187,7 @@ def verify_payment(request):
             'message': 'Your account has been temporarily blocked.'
         })
     
-    if not razorpay_client:
+    if get_gateway() is None:
         return JsonResponse({
             'success': False,
             'message': 'Payment gateway is not properly configured.'
@@ -272,48 +227,28 @@ def verify_payment(request):
                 'message': 'Payment verification failed.'
             })
         
-        # Update order
+        # Take stock and confirm the order in one transaction
         try:
-            order = Order.objects.get(id=order_id, user=request.user)
-            order.razorpay_payment_id = razorpay_payment_id
-            order.status = 'confirmed'
-            order.save()
-            
-            # Mark coupon as used if applied
-            if order.coupon:
-                order.coupon.used_count += 1
-                order.coupon.save()
-                
-                # Create coupon usage record
-                CouponUsage.objects.create(
-                    user=request.user,
-                    coupon=order.coupon,
-                    order=order
-                )
-            
-            # Update stock and clear cart
-            cart = Cart.objects.get(user=request.user)
-            for item in order.items.all():
-                item.variant.stock_quantity -= item.quantity
-                item.variant.save()
-            
-            cart.items.all().delete()
-            cart.applied_coupon = None
-            cart.save()
-            
-            logger.info(f"Payment verified successfully for order {order.order_number}")
-            
+            order = confirm_online_payment(order_id, request.user, razorpay_payment_id)
+        except InsufficientStock as e:
+            logger.warning(f"Paid order {order_id} cancelled, stock ran out: {e}")
             return JsonResponse({
-                'success': True,
-                'message': 'Payment verified successfully!',
-                'redirect_url': f'/order-success/{order.id}/'
+                'success': False,
+                'message': f'{e} Your order was cancelled and the amount has been refunded to your wallet.'
             })
-        
         except Order.DoesNotExist:
             return JsonResponse({
                 'success': False,
                 'message': 'Order not found.'
             })
+        
+        logger.info(f"Payment verified successfully for order {order.order_number}")
+        
+        return JsonResponse({
+            'success': True,
+            'message': 'Payment verified successfully!',
+            'redirect_url': f'/order-success/{order.id}/'
+        })
     
     except json.JSONDecodeError:
         return JsonResponse({
@@ -327,6 +262,32 @@ def verify_payment(request):
             'message': 'An error occurred while verifying payment.'
         })
         
+@csrf_exempt
+@require_POST
+def razorpay_webhook(request):
+    """Record a signed Razorpay event; process_payment_events settles it outside the request"""
+    secret = settings.RAZORPAY_WEBHOOK_SECRET
+    signature = request.headers.get('X-Razorpay-Signature', '')
+    if not secret or not verify_webhook_signature(request.body, signature, secret):
+        logger.warning("Rejected Razorpay webhook with a bad signature")
+        return JsonResponse({
+            'success': False,
+            'message': 'Invalid signature.'
+        }, status=400)
+    
+    try:
+        event, created = record_event(request.body, request.headers.get('X-Razorpay-Event-Id'))
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'message': 'Invalid payload.'
+        }, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'message': 'Event received.' if created else 'Duplicate event ignored.'
+    })
+        
 @login_required
 @require_POST
 def retry_payment(request, order_id):
@@ -336,7 +297,8 @@ def retry_payment(request, order_id):
             'message': 'Your account has been temporarily blocked.'
         })
     
-    if not razorpay_client:
+    gateway = get_gateway()
+    if gateway is None:
         return JsonResponse({
             'success': False,
             'message': 'Payment gateway is not properly configured.'
@@ -351,18 +313,22 @@ def retry_payment(request, order_id):
                 'message': 'This order cannot be retried.'
             })
         
-        # Create new Razorpay order
+        # Hold the stock again for the new payment window
         try:
-            razorpay_order = razorpay_client.order.create({
-                'amount': int(order.total_amount * 100),
-                'currency': 'INR',
-                'payment_capture': 1
+            renew_reservation(order)
+        except (OrderPlacementError, InsufficientStock) as e:
+            return JsonResponse({
+                'success': False,
+                'message': str(e)
             })
-        except Exception as e:
-            logger.error(f"Failed to create Razorpay order for retry: {e}")
+        
+        # Create new Razorpay order
+        try:
+            razorpay_order = gateway.create_order(to_paise(order.total_amount))
+        except GatewayError as e:
             return JsonResponse({
                 'success': False,
-                'message': 'Failed to create payment order. Please try again.'
+                'message': str(e)
             })
         
         # Update order with new Razorpay order ID
@@ -373,7 +339,7 @@ def retry_payment(request, order_id):
             'success': True,
             'razorpay_order_id': razorpay_order['id'],
             'order_id': order.id,
-            'amount': int(order.total_amount * 100),
+            'amount': to_paise(order.total_amount),
             'currency': 'INR',
             'name': 'AZRION',
             'description': f'Order #{order.order_number}',
@@ -396,82 +362,9 @@ def retry_payment(request, order_id):
             'message': 'An error occurred while retrying payment.'
         })
         
-def get_available_coupons(user, cart_total):
-    """Get all available coupons for the user"""
-    now = timezone.now()
-    available_coupons = []
-
-    # Get regular active coupons (public coupons available to all users)
-    regular_coupons = Coupon.objects.filter(
-        is_active=True,
-        valid_from__lte=now,
-        valid_until__gte=now,
-        minimum_amount__lte=cart_total
-    ).exclude(
-        # Exclude coupons that are tied to referral rewards
-        referralreward__isnull=False
-    )
-
-    for coupon in regular_coupons:
-        # Check if coupon has usage limit
-        if coupon.usage_limit:
-            current_usage = CouponUsage.objects.filter(coupon=coupon).count()
-            if current_usage >= coupon.usage_limit:
-                continue
-        
-        # Check if user has already used this coupon (assuming one use per user)
-        if CouponUsage.objects.filter(coupon=coupon, user=user).exists():
-            continue
-        
-        # Calculate discount for display
-        discount_amount = coupon.calculate_discount(cart_total)
-        
-        available_coupons.append({
-            'coupon': coupon,
-            'discount_amount': discount_amount,
-            'type': 'regular'
-        })
-
-    # Get referral reward coupons ONLY for the current user
-    referral_rewards = ReferralReward.objects.filter(
-        referrer=user,  # Only for the current user
-        is_claimed=False,
-        coupon__isnull=False,
-        coupon__is_active=True,
-        coupon__valid_from__lte=now,
-        coupon__valid_until__gte=now,
-        coupon__minimum_amount__lte=cart_total
-    ).select_related('coupon')
-
-    for reward in referral_rewards:
-        coupon = reward.coupon
-        
-        # Double check that this referral reward belongs to the current user
-        if reward.referrer != user:
-            continue
-            
-        # Check if already used by this user
-        if CouponUsage.objects.filter(coupon=coupon, user=user).exists():
-            continue
-            
-        discount_amount = coupon.calculate_discount(cart_total)
-        
-        available_coupons.append({
-            'coupon': coupon,
-            'discount_amount': discount_amount,
-            'type': 'referral',
-            'referral_reward': reward
-        })
-
-    # Sort by discount amount (highest first)
-    available_coupons.sort(key=lambda x: x['discount_amount'], reverse=True)
-
-    return available_coupons
-
 @login_required
 @require_POST
 def apply_coupon(request):
-    from decimal import Decimal
     if check_user_blocked(request.user):
         return JsonResponse({
             'success': False,
@@ -511,29 +404,18 @@ def apply_coupon(request):
                 'message': 'Invalid coupon code.'
             })
         
-        # Calculate current cart total
-        cart_items = cart.items.select_related('product', 'variant')
-        available_items = [item for item in cart_items if item.is_available()]
-        subtotal = sum(Decimal(item.get_total_price()) for item in available_items)
-        
-        # Validate coupon
-        is_valid, message = coupon.is_valid(request.user, subtotal)
-        if not is_valid:
+        # Price the cart with the new coupon; an invalid one comes back with its reason
+        pricing = CartPricer(request.user).price(cart, coupon=coupon)
+        if pricing.coupon_error:
             return JsonResponse({
                 'success': False,
-                'message': message
+                'message': pricing.coupon_error
             })
         
         # Apply coupon
         cart.applied_coupon = coupon
         cart.save()
         
-        # Calculate new totals
-        coupon_discount = coupon.calculate_discount(subtotal)
-        discounted_subtotal = subtotal - coupon_discount
-        shipping_charge = Decimal('50.00') if subtotal < Decimal('500') else Decimal('0.00')
-        total_amount = subtotal + shipping_charge
-        
         return JsonResponse({
             'success': True,
             'message': f'Coupon "{coupon_code}" applied successfully!',
@@ -541,10 +423,10 @@ def apply_coupon(request):
             'coupon_description': coupon.description or '',
             'discount_type': coupon.discount_type,
             'discount_value': float(coupon.discount_value),
-            'subtotal': float(subtotal),
-            'coupon_discount': float(coupon_discount),
-            'shipping_charge': float(shipping_charge),
-            'total_amount': float(total_amount)
+            'subtotal': float(pricing.subtotal),
+            'coupon_discount': float(pricing.coupon_discount),
+            'shipping_charge': float(pricing.shipping_charge),
+            'total_amount': float(pricing.total_amount)
         })
     
     except json.JSONDecodeError:
@@ -582,19 +464,15 @@ def remove_coupon(request):
         cart.save()
         
         # Recalculate totals
-        cart_items = cart.items.select_related('product', 'variant')
-        available_items = [item for item in cart_items if item.is_available()]
-        subtotal = sum(item.get_total_price() for item in available_items)
-        shipping_charge = Decimal('50.00') if subtotal < 500 else Decimal('0.00')
-        total_amount = subtotal + shipping_charge
+        pricing = CartPricer(request.user).price(cart)
         
         return JsonResponse({
             'success': True,
             'message': f'Coupon "{coupon_code}" removed successfully.',
-            'subtotal': float(subtotal),
+            'subtotal': float(pricing.subtotal),
             'coupon_discount': 0,
-            'shipping_charge': float(shipping_charge),
-            'total_amount': float(total_amount)
+            'shipping_charge': float(pricing.shipping_charge),
+            'total_amount': float(pricing.total_amount)
         })
         
     except Cart.DoesNotExist:
@@ -608,53 +486,3 @@ def remove_coupon(request):
             'success': False,
             'message': 'An error occurred while removing the coupon.'
         })
-        
-@login_required
-@require_POST
-def remove_coupon(request):
-    if check_user_blocked(request.user):
-        return JsonResponse({
-            'success': False,
-            'message': 'Your account has been temporarily blocked.'
-        })
-    
-    try:
-        cart = Cart.objects.get(user=request.user)
-        
-        if not cart.applied_coupon:
-            return JsonResponse({
-                'success': False,
-                'message': 'No coupon is currently applied.'
-            })
-        
-        coupon_code = cart.applied_coupon.code
-        cart.applied_coupon = None
-        cart.save()
-        
-        # Recalculate totals
-        cart_items = cart.items.select_related('product', 'variant')
-        available_items = [item for item in cart_items if item.is_available()]
-        subtotal = sum(item.get_total_price() for item in available_items)
-        shipping_charge = Decimal('50.00') if subtotal < 500 else Decimal('0.00')
-        total_amount = subtotal + shipping_charge
-        
-        return JsonResponse({
-            'success': True,
-            'message': f'Coupon "{coupon_code}" removed successfully.',
-            'subtotal': float(subtotal),
-            'coupon_discount': 0,
-            'shipping_charge': float(shipping_charge),
-            'total_amount': float(total_amount)
-        })
-        
-    except Cart.DoesNotExist:
-        return JsonResponse({
-            'success': False,
-            'message': 'Cart not found.'
-        })
-    except Exception as e:
-        logger.error(f"Error removing coupon: {e}")
-        return JsonResponse({
-            'success': False,
-            'message': 'An error occurred while removing the coupon.'
-        })
\ No newline at end of file
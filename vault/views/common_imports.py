@@ -15,6 +15,9 @@ from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
 from django.utils import timezone
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from ..pagination import CursorPaginator
+from ..idempotency import idempotent
+from ..gateway import get_gateway, GatewayError
 import random
 import re
 from django.http import JsonResponse, HttpResponse
@@ -25,7 +28,6 @@ from xhtml2pdf import pisa
 from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
 import json
-import razorpay
 import hmac
 import hashlib
 import logging
@@ -37,21 +39,6 @@ from django.conf.urls import handler404
 
 logger = logging.getLogger(__name__)
 
-try:
-    if hasattr(settings, 'RAZORPAY_KEY_ID') and hasattr(settings, 'RAZORPAY_KEY_SECRET'):
-        if settings.RAZORPAY_KEY_ID and settings.RAZORPAY_KEY_SECRET:
-            razorpay_client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
-            logger.info("Razorpay client initialized successfully")
-        else:
-            razorpay_client = None
-            logger.error("Razorpay keys are empty")
-    else:
-        razorpay_client = None
-        logger.error("Razorpay keys not found in settings")
-except Exception as e:
-    razorpay_client = None
-    logger.error(f"Failed to initialize Razorpay client: {e}")
-
 def generate_otp():
     return str(random.randint(100000, 999999))
 
@@ -1,4 +1,5 @@
 from .common_imports import *
+from ..offers import cached_catalog_value
 
 @never_cache
 def front_page(request):
@@ -23,33 +24,7 @@ def home_page(request):
     if request.user.is_staff:
         return redirect('user_management')
     
-    now_utc = timezone.now()
-    now = now_utc.astimezone(ZoneInfo("Asia/Kolkata"))
-    
-    featured_products = Product.objects.filter(is_deleted=False).select_related('category').prefetch_related('variants__images')[:6]
-    
-    for product in featured_products:
-        original_product_offer = product.product_offer or 0
-        
-        # Get highest valid category offer (if exists)
-        category_offers = product.category.category_offers.filter(
-            is_active=True,
-            valid_from__lte=now,
-            valid_until__gte=now
-        ).order_by('-discount_percentage')
-        
-        category_offer = category_offers.first().discount_percentage if category_offers.exists() else 0
-        best_offer = max(original_product_offer, category_offer)
-        product.product_offer = best_offer
-        
-        if best_offer > 0:
-            discount_amount = (product.price * best_offer) / 100
-            product.discounted_price = product.price - discount_amount
-        else:
-            product.discounted_price = product.price
-        
-        product.display_image = product.get_main_image()
-    
+    featured_products = cached_catalog_value('home_featured', load_featured_products)
     categories = Category.objects.filter(is_deleted=False)[:3]
     
     return render(request, 'home.html', {
@@ -57,6 +32,12 @@ def home_page(request):
         'categories': categories
     })
     
+def load_featured_products():
+    featured_products = list(Product.objects.filter(is_deleted=False).select_related('category').prefetch_related('variants__images')[:6])
+    for product in featured_products:
+        product.display_image = product.get_main_image()
+    return featured_products
+
 def t_o_s_page(request):
     return render(request, 'terms_of_service.html')
 
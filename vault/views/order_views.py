@@ -1,4 +1,7 @@
 from .common_imports import *
+from ..inventory import InsufficientStock
+from ..orders import OrderPlacementError, place_order as place_cart_order
+from ..refunds import RefundError, cancel_order as cancel_paid_order, cancel_order_item as cancel_paid_order_item
 
 @never_cache
 @login_required
@@ -23,14 +26,7 @@ def user_orders(request):
             Q(items__product__product_name__icontains=query)
         ).distinct()
     
-    orders_qs = orders_qs.order_by('-created_at')
-    
-    paginator = Paginator(orders_qs, 5)
-    page_number = request.GET.get('page', 1)
-    try:
-        orders = paginator.page(page_number)
-    except (PageNotAnInteger, EmptyPage):
-        orders = paginator.page(1)
+    orders = CursorPaginator(orders_qs, 5, count=None).page(request.GET.get('cursor'))
     
     context = {
         'orders': orders,
@@ -52,21 +48,13 @@ def cancel_order(request, order_id):
     
     if request.method == 'POST':
         if order.can_be_cancelled():
-            order.status = 'cancelled'
-            order.save()
+            try:
+                refund_amount = cancel_paid_order(order.id, user=request.user)
+            except RefundError as e:
+                messages.error(request, str(e))
+                return redirect('user_orders')
             
-            if order.payment_method == 'online' and order.status != 'delivered':
-                wallet, created = Wallet.objects.get_or_create(user=request.user)
-                if created:
-                    wallet.refresh_from_db()
-                
-                # Add refund amount to wallet
-                refund_amount = order.total_amount
-                wallet.add_money(
-                    amount=refund_amount,
-                    description=f"Refund for cancelled order #{order.order_number}"
-                )
-                
+            if refund_amount:
                 messages.success(request, f"Order {order.order_number} has been cancelled successfully. ₹{refund_amount} has been refunded to your wallet.")
             else:
                 messages.success(request, f"Order {order.order_number} has been cancelled successfully.")
@@ -98,6 +86,7 @@ def order_detail(request, order_id):
     
 @login_required
 @require_POST
+@idempotent
 def place_order(request):
     if check_user_blocked(request.user):
         return JsonResponse({
@@ -125,105 +114,13 @@ def place_order(request):
             })
         
         try:
-            cart = Cart.objects.get(user=request.user)
-            cart_items = cart.items.select_related('product', 'variant')
-        except Cart.DoesNotExist:
+            order, wallet = place_cart_order(request.user, address, payment_method)
+        except (OrderPlacementError, InsufficientStock) as e:
             return JsonResponse({
                 'success': False,
-                'message': 'Cart is empty.'
+                'message': str(e)
             })
         
-        available_items = [item for item in cart_items if item.is_available()]
-        if not available_items:
-            return JsonResponse({
-                'success': False,
-                'message': 'No available items in cart.'
-            })
-        
-        subtotal = sum(item.get_total_price() for item in available_items)
-        
-        # Handle coupon discount
-        coupon_discount = Decimal('0.00')
-        applied_coupon = None
-        if cart.applied_coupon:
-            applied_coupon = cart.applied_coupon
-            is_valid, message = applied_coupon.is_valid(request.user, subtotal)
-            if is_valid:
-                coupon_discount = applied_coupon.calculate_discount(subtotal)
-            else:
-                cart.applied_coupon = None
-                cart.save()
-        
-        discounted_subtotal = float(subtotal) - float(coupon_discount)
-        shipping_charge = Decimal('50.00') if discounted_subtotal < 500 else Decimal('0.00')
-        total_amount = float(discounted_subtotal) + float(shipping_charge)
-        wallet, created = Wallet.objects.get_or_create(user=request.user)
-        if payment_method == 'wallet':
-            # Get or create wallet
-            
-            
-            # Check if wallet has sufficient balance
-            if wallet.balance < Decimal(str(total_amount)):
-                return JsonResponse({
-                    'success': False,
-                    'message': f'Insufficient wallet balance. Available: ₹{wallet.balance}, Required: ₹{total_amount:.2f}'
-                })
-        
-        order_number = f"ORD{timezone.now().strftime('%Y%m%d%H%M%S')}{random.randint(100, 999)}"
-        order = Order.objects.create(
-            user=request.user,
-            order_number=order_number,
-            subtotal=subtotal,
-            coupon=applied_coupon,
-            coupon_discount=coupon_discount,
-            shipping_charge=shipping_charge,
-            total_amount=total_amount,
-            payment_method=payment_method,
-            shipping_address=address,
-            status='pending'
-        )
-        
-        for cart_item in available_items:
-            OrderItem.objects.create(
-                order=order,
-                product=cart_item.product,
-                variant=cart_item.variant,
-                quantity=cart_item.quantity,
-                price=cart_item.get_unit_price()
-            )
-            cart_item.variant.stock_quantity -= cart_item.quantity
-            cart_item.variant.save()
-        
-        if payment_method == 'wallet':
-            # Deduct amount from wallet
-            wallet = Wallet.objects.get(user=request.user)
-            if wallet.deduct_money(total_amount, f"Payment for Order #{order_number}"):
-                order.status = 'confirmed'  # Wallet payments are immediately confirmed
-                order.save()
-            else:
-                # This shouldn't happen as we already checked balance, but just in case
-                order.delete()  # Remove the order if wallet deduction fails
-                return JsonResponse({
-                    'success': False,
-                    'message': 'Wallet payment failed. Please try again.'
-                })
-        
-        # Mark coupon as used if applied
-        if applied_coupon:
-            applied_coupon.used_count += 1
-            applied_coupon.save()
-            
-            # Create coupon usage record
-            CouponUsage.objects.create(
-                user=request.user,
-                coupon=applied_coupon,
-                order=order
-            )
-        
-        cart.items.all().delete()
-        cart.applied_coupon = None
-        cart.save()
-        
         if payment_method == 'wallet':
             success_message = f'Order placed successfully using wallet! Remaining balance: ₹{wallet.balance:.2f}'
         else:
@@ -232,7 +129,7 @@ def place_order(request):
         return JsonResponse({
             'success': True,
             'message': success_message,
-            'order_number': order_number,
+            'order_number': order.order_number,
             'order_id': order.id,
             'redirect_url': f'/order-success/{order.id}/'
         })
@@ -372,42 +269,19 @@ def cancel_order_item(request, item_id):
             })
         
         try:
-            order_item = OrderItem.objects.get(
-                id=item_id,
-                order__user=request.user
-            )
-        except OrderItem.DoesNotExist:
+            order_item, refund_amount = cancel_paid_order_item(item_id, request.user)
+        except Order.DoesNotExist:
             return JsonResponse({
                 'success': False,
                 'message': 'Order item not found.'
             })
-        
-        if not order_item.can_be_cancelled():
+        except RefundError as e:
             return JsonResponse({
                 'success': False,
-                'message': 'This item cannot be cancelled.'
+                'message': str(e)
             })
         
-        # Cancel the item
-        order_item.status = 'cancelled'
-        order_item.save()
-        
-        # Restore stock
-        order_item.variant.stock_quantity += order_item.quantity
-        order_item.variant.save()
-        
-        if order_item.order.payment_method == 'online' and order_item.order.status != 'delivered':
-            wallet, created = Wallet.objects.get_or_create(user=request.user)
-            if created:
-                wallet.refresh_from_db()
-            
-            # Calculate refund amount for this item
-            refund_amount = order_item.get_total_price()
-            wallet.add_money(
-                amount=refund_amount,
-                description=f"Refund for cancelled item {order_item.product.product_name} from order #{order_item.order.order_number}"
-            )
-            
+        if refund_amount:
             return JsonResponse({
                 'success': True,
                 'message': f'{order_item.product.product_name} has been cancelled successfully. ₹{refund_amount} has been refunded to your wallet.'
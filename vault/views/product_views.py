@@ -1,114 +1,79 @@
 from .common_imports import *
+from ..catalog import catalog_queryset, catalog_ordering, catalog_facets, COLOR_LABELS, PRODUCTS_PER_PAGE
+from ..pagination import CursorPaginator
+from ..offers import cached_catalog_value
+from .. import autocomplete
 
 @never_cache
 @login_required
 def product_list(request):
     query = request.GET.get('q', '').strip()
     category_id = request.GET.get('category', '')
-    sort_by = request.GET.get('sort', 'newest')
+    sort_by = request.GET.get('sort') or ('relevance' if query else 'newest')
     min_price = request.GET.get('min_price', '')
     max_price = request.GET.get('max_price', '')
+    color = request.GET.get('color', '')
+    in_stock = request.GET.get('in_stock') == '1'
     
-    now = timezone.now()
-    
-    # Base queryset
-    products = Product.objects.filter(
-        is_deleted=False,
-        category__is_deleted=False,
-        category__is_blocked=False
-    ).select_related('category').prefetch_related('variants__images')
-    
-    # Prepare product list for in-memory manipulation
-    products_list = list(products)
-    
-    # Apply category offers if higher than product offers
-    for product in products_list:
-        product_offer = product.product_offer or 0
-        
-        # Get valid category offer (if any)
-        category_offers = product.category.category_offers.filter(
-            is_active=True,
-            valid_from__lte=now,
-            valid_until__gte=now
-        ).order_by('-discount_percentage')
-        
-        category_offer = category_offers.first().discount_percentage if category_offers.exists() else 0
-        
-        # Decide final offer
-        best_offer = max(product_offer, category_offer)
-        product.product_offer = best_offer
-        
-        if best_offer > 0:
-            discount_amount = (product.price * best_offer) / 100
-            product.discounted_price = product.price - discount_amount
-        else:
-            product.discounted_price = product.price
-        
-        product.display_image = product.get_main_image()
-    
-    # Filtering
-    if query:
-        products_list = [p for p in products_list if
-            query.lower() in p.product_name.lower() or
-            query.lower() in p.product_description.lower() or
-            query.lower() in p.category.name.lower()
-        ]
+    if color not in COLOR_LABELS:
+        color = ''
     
+    category_id_int = None
     if category_id:
         try:
             category_id_int = int(category_id)
-            products_list = [p for p in products_list if p.category.id == category_id_int]
         except (ValueError, TypeError):
             category_id = ''
     
+    min_price_val = None
     if min_price:
         try:
             min_price_val = float(min_price)
-            products_list = [p for p in products_list if p.discounted_price >= min_price_val]
         except (ValueError, TypeError):
             min_price = ''
     
+    max_price_val = None
     if max_price:
         try:
             max_price_val = float(max_price)
-            products_list = [p for p in products_list if p.discounted_price <= max_price_val]
         except (ValueError, TypeError):
             max_price = ''
     
-    # Sorting
-    if sort_by == 'price_low':
-        products_list.sort(key=lambda p: p.discounted_price)
-    elif sort_by == 'price_high':
-        products_list.sort(key=lambda p: p.discounted_price, reverse=True)
-    elif sort_by == 'name_asc':
-        products_list.sort(key=lambda p: p.product_name)
-    elif sort_by == 'name_desc':
-        products_list.sort(key=lambda p: p.product_name, reverse=True)
-    elif sort_by == 'oldest':
-        products_list.sort(key=lambda p: p.created_at)
-    else:
-        products_list.sort(key=lambda p: p.created_at, reverse=True)
-    
-    # Paginator
-    paginator = Paginator(products_list, 12)
-    page = request.GET.get('page')
-    try:
-        products_page = paginator.page(page)
-    except PageNotAnInteger:
-        products_page = paginator.page(1)
-    except EmptyPage:
-        products_page = paginator.page(paginator.num_pages)
-    
-    # For price slider range
-    all_prices = [p.discounted_price for p in products_list]
-    if all_prices:
-        min_range = min(all_prices)
-        max_range = max(all_prices)
-    else:
-        min_range = 0
-        max_range = 10000
-    
-    categories = Category.objects.filter(is_deleted=False).order_by('name')
+    # Filtering, pricing and sorting all happen in the database
+    products = catalog_queryset(
+        query=query,
+        category_id=category_id_int,
+        min_price=min_price_val,
+        max_price=max_price_val,
+        color=color or None,
+        in_stock=in_stock,
+    )
+    
+    # Keyset pagination; the total comes from the facet query below
+    paginator = CursorPaginator(products, PRODUCTS_PER_PAGE, ordering=catalog_ordering(query, sort_by), count=None)
+    products_page = paginator.page(request.GET.get('cursor'))
+    
+    for product in products_page:
+        product.display_image = product.get_main_image()
+    
+    categories = list(Category.objects.filter(is_deleted=False).order_by('name'))
+    
+    # Sidebar counts and price slider range, one aggregate query per filter combination
+    filters_key = hashlib.md5(
+        f"{query.lower()}|{category_id_int}|{min_price_val}|{max_price_val}|{color}|{in_stock}".encode()
+    ).hexdigest()
+    facets = cached_catalog_value(f"facets:{filters_key}", lambda: catalog_facets(
+        query=query,
+        category_id=category_id_int,
+        min_price=min_price_val,
+        max_price=max_price_val,
+        color=color or None,
+        in_stock=in_stock,
+        category_ids=[category.id for category in categories],
+    ))
+    
+    for category in categories:
+        category.facet_count = facets['categories'].get(category.id, 0)
     
     context = {
         'products': products_page,
@@ -118,8 +83,12 @@ def product_list(request):
         'sort_by': sort_by,
         'min_price': min_price,
         'max_price': max_price,
-        'price_range': {'min_price': min_range, 'max_price': max_range},
-        'total_products': paginator.count,
+        'price_range': facets['price_range'],
+        'total_products': facets['total'],
+        'selected_color': color,
+        'selected_color_label': COLOR_LABELS.get(color, ''),
+        'in_stock': in_stock,
+        'facets': facets,
     }
     
     return render(request, 'product_list.html', context)
@@ -128,47 +97,26 @@ def product_list(request):
 @login_required
 def product_detail_page(request, product_id):
     try:
-        product = get_object_or_404(Product, id=product_id)
+        product = get_object_or_404(Product.objects.select_related('category'), id=product_id)
     except Product.DoesNotExist:
         messages.error(request, "Product not found.")
         return redirect('product_list')
-    now =timezone.now()
-    product_offer = product.product_offer or 0
-    # Get valid category offer (if any)
-    category_offers = product.category.category_offers.filter(
-        is_active=True,
-        valid_from__lte=now,
-        valid_until__gte=now
-    ).order_by('-discount_percentage')
-    
-    category_offer = category_offers.first().discount_percentage if category_offers.exists() else 0
-    
-    # Decide final offer
-    best_offer = max(product_offer, category_offer)
-    product.product_offer = best_offer
-    if best_offer > 0:
-        discount_amount = (product.price * best_offer) / 100
-        product.discounted_price = product.price - discount_amount
-    else:
-        product.discounted_price = product.price
-        
-    if product.product_offer > 0:
-        discount_amount = (product.price * product.product_offer) / 100
-        product.discounted_price = product.price - discount_amount
-        product.savings = discount_amount
-    else:
-        product.discounted_price = product.price
-        product.savings = 0
-    
-    variants = product.variants.prefetch_related('images').filter(is_active=True)
-    available_variants = variants.filter(stock_quantity__gt=0)
+    
+    # Variants and their images are loaded once; stock and availability are derived in Python
+    variants = list(product.variants.filter(is_active=True).prefetch_related('images'))
+    available_variants = [variant for variant in variants if variant.stock_quantity > 0]
+    total_stock = sum(variant.stock_quantity for variant in variants)
     
     reviews = product.reviews.select_related('user').order_by('-created_at')
-    rating_stats = {
-        'average': product.get_average_rating(),
-        'total': product.get_total_reviews(),
-        'distribution': product.get_rating_distribution()
-    }
+    rating_stats = product.get_rating_stats()
+    rating_stats['bars'] = [
+        {
+            'stars': stars,
+            'count': rating_stats['distribution'][stars],
+            'percent': round(rating_stats['distribution'][stars] * 100 / rating_stats['total']) if rating_stats['total'] else 0,
+        }
+        for stars in range(5, 0, -1)
+    ]
     
     related_products = Product.objects.filter(
         category=product.category,
@@ -176,26 +124,22 @@ def product_detail_page(request, product_id):
     ).exclude(id=product_id).select_related('category').prefetch_related('variants__images')[:4]
     
     for related_product in related_products:
-        if related_product.product_offer > 0:
-            discount_amount = (related_product.price * related_product.product_offer) / 100
-            related_product.discounted_price = related_product.price - discount_amount
-        else:
-            related_product.discounted_price = related_product.price
         related_product.display_image = related_product.get_main_image()
     
     specifications = {
         'Category': product.category.name,
-        'Total Stock': product.get_total_stock(),
-        'Available Colors': variants.count(),
+        'Total Stock': total_stock,
+        'Available Colors': len(variants),
     }
     
-    if product.product_offer > 0:
-        specifications['Discount'] = f"{product.product_offer}% OFF"
+    if product.applied_offer > 0:
+        specifications['Discount'] = f"{product.applied_offer}% OFF"
     
     context = {
         'product': product,
         'variants': variants,
         'available_variants': available_variants,
+        'total_stock': total_stock,
         'reviews': reviews,
         'rating_stats': rating_stats,
         'related_products': related_products,
@@ -207,9 +151,10 @@ def product_detail_page(request, product_id):
 def check_product_availability(request, product_id):
     try:
         product = Product.objects.get(id=product_id)
+        available_stock = product.get_available_stock() if product.is_available() else 0
         return JsonResponse({
-            'available': product.is_available(),
-            'total_stock': product.get_total_stock(),
+            'available': available_stock > 0,
+            'total_stock': available_stock,
             'is_deleted': product.is_deleted
         })
     except Product.DoesNotExist:
@@ -217,4 +162,21 @@ def check_product_availability(request, product_id):
             'available': False,
             'total_stock': 0,
             'is_deleted': True
-        })
\ No newline at end of file
+        })
+
+@login_required
+@require_GET
+def product_suggestions(request):
+    """Search-as-you-type suggestions served from the in-process prefix index, no database hit"""
+    query = request.GET.get('q', '').strip()[:100]
+    products_url = reverse('products_list')
+    suggestions = []
+    for kind, object_id, label in autocomplete.suggest(query):
+        if kind == 'product':
+            url = reverse('products_details', args=[object_id])
+        elif kind == 'category':
+            url = f"{products_url}?category={object_id}"
+        else:
+            url = f"{products_url}?color={object_id}"
+        suggestions.append({'type': kind, 'label': label, 'url': url})
+    return JsonResponse({'success': True, 'suggestions': suggestions})
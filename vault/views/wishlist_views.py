@@ -1,4 +1,5 @@
 from .common_imports import *
+from ..nav_counts import get_nav_counts
 
 @never_cache
 @login_required
@@ -14,7 +15,7 @@ def wishlist_view(request):
     
     for item in wishlist_items:
         item.display_image = item.product.get_main_image()
-        item.discounted_price = item.product.get_discounted_price()
+        item.discounted_price = item.product.effective_price
     
     context = {
         'wishlist_items': wishlist_items,
@@ -75,7 +76,7 @@ def add_to_wishlist(request):
             'success': True,
             'message': message,
             'item_created': item_created,
-            'wishlist_count': wishlist.items.count(),
+            'wishlist_count': get_nav_counts(request.user)['wishlist'],
         })
     
     except json.JSONDecodeError:
@@ -110,16 +111,14 @@ def remove_from_wishlist(request):
             })
         
         try:
-            wishlist_item = WishlistItem.objects.get(id=wishlist_item_id, wishlist__user=request.user)
+            wishlist_item = WishlistItem.objects.select_related('product', 'wishlist').get(id=wishlist_item_id, wishlist__user=request.user)
             product_name = wishlist_item.product.product_name
             wishlist_item.delete()
             
-            wishlist = Wishlist.objects.get(user=request.user)
-            
             return JsonResponse({
                 'success': True,
                 'message': f'{product_name} removed from wishlist.',
-                'wishlist_count': wishlist.items.count(),
+                'wishlist_count': get_nav_counts(request.user)['wishlist'],
             })
         except WishlistItem.DoesNotExist:
             return JsonResponse({
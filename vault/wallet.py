@@ -0,0 +1,89 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Wallet, WalletTransaction
+from .money import to_money
+
+
+class InsufficientBalance(Exception):
+    def __init__(self, wallet, amount):
+        self.wallet = wallet
+        self.amount = amount
+        super().__init__(f"Insufficient wallet balance. Available: ₹{wallet.balance}, Required: ₹{amount:.2f}")
+
+
+def _lock_wallet(user_id):
+    Wallet.objects.get_or_create(user_id=user_id)
+    return Wallet.objects.select_for_update().get(user_id=user_id)
+
+
+def _post(user_id, transaction_type, amount, description):
+    amount = to_money(amount)
+    with transaction.atomic():
+        wallet = _lock_wallet(user_id)
+        if transaction_type == 'debit':
+            if wallet.balance < amount:
+                raise InsufficientBalance(wallet, amount)
+            wallet.balance -= amount
+        else:
+            wallet.balance += amount
+        wallet.save(update_fields=['balance', 'updated_at'])
+        return WalletTransaction.objects.create(
+            wallet=wallet,
+            transaction_type=transaction_type,
+            amount=amount,
+            balance_after=wallet.balance,
+            description=description
+        )
+
+
+def credit(user_id, amount, description=""):
+    """Add money to a user's wallet (creating it if needed); returns the ledger entry.
+
+    The wallet row is locked for the balance change and the entry, so
+    concurrent credits and debits serialize instead of overwriting each other.
+    The entry's wallet carries the new balance.
+    """
+    return _post(user_id, 'credit', amount, description)
+
+
+def debit(user_id, amount, description=""):
+    """Take money from a user's wallet; raises InsufficientBalance, checked under the row lock"""
+    return _post(user_id, 'debit', amount, description)
+
+
+def bulk_credit(credits):
+    """Post many (user_id, amount, description) credits in one transaction.
+
+    Wallets are created in one statement, locked together in user order (so
+    two bulk runs can't deadlock), updated with one bulk UPDATE and the ledger
+    entries written with one INSERT. Returns the entries in input order.
+    """
+    credits = [(user_id, to_money(amount), description) for user_id, amount, description in credits]
+    if not credits:
+        return []
+    user_ids = sorted({user_id for user_id, _, _ in credits})
+    with transaction.atomic():
+        Wallet.objects.bulk_create([Wallet(user_id=user_id) for user_id in user_ids], ignore_conflicts=True)
+        wallets = {
+            wallet.user_id: wallet
+            for wallet in Wallet.objects.select_for_update().filter(user_id__in=user_ids).order_by('user_id')
+        }
+
+        entries = []
+        for user_id, amount, description in credits:
+            wallet = wallets[user_id]
+            wallet.balance += amount
+            entries.append(WalletTransaction(
+                wallet=wallet,
+                transaction_type='credit',
+                amount=amount,
+                balance_after=wallet.balance,
+                description=description
+            ))
+
+        now = timezone.now()
+        for wallet in wallets.values():
+            wallet.updated_at = now
+        Wallet.objects.bulk_update(list(wallets.values()), ['balance', 'updated_at'])
+        return WalletTransaction.objects.bulk_create(entries)
@@ -4,6 +4,7 @@ from .views import *
 
 urlpatterns = [
     path('dashboard/', dashboard, name='dashboard'),
+    path('gateway-metrics/', gateway_metrics, name='gateway_metrics'),
     
     path('user-management/', user_management_page, name='user_management'),
     path('block-user/<int:user_id>/', block_user, name='block_user'),
@@ -47,6 +48,7 @@ urlpatterns = [
     path('return-requests/', return_requests_page, name='return_requests_page'),
     path('verify-return-request/<int:return_request_id>/', verify_return_request, name='verify_return_request'),
     path('verify-item-return-request/<int:item_return_id>/', verify_item_return_request, name='verify_item_return_request'),
+    path('return-requests/bulk-approve/', bulk_approve_returns, name='bulk_approve_returns'),
     
     path('inventory/', inventory_management, name='inventory_management'),
     path('inventory/<int:variant_id>/update-stock/', update_stock, name='update_stock'),
@@ -2,6 +2,7 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.views.decorators.cache import never_cache
 from django.shortcuts import render, redirect, get_object_or_404
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from vault.pagination import CursorPaginator
 from vault.models import User, Category, Product, ProductVariant, VariantImage, Order, ReturnRequest, ItemReturnRequest, Wallet, ReferralReward, CategoryOffer, ReferralOffer, Coupon, CouponUsage, OrderItem, WalletTransaction
 from django.contrib import messages
 from django.core.files.base import ContentFile
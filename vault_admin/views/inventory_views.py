@@ -1,4 +1,5 @@
 from .common_imports import *
+from vault.inventory import set_stock
 
 @login_required
 @user_passes_test(lambda u: u.is_staff)
@@ -26,18 +27,12 @@ def inventory_management(request):
     elif stock_filter == 'available':
         variants = variants.filter(stock_quantity__gt=5)
         
-    variants = variants.order_by('stock_quantity', 'product__product_name')
-    
+
     categories = Category.objects.filter(is_deleted=False).order_by('name')
     
-    paginator = Paginator(variants, 15)
-    page = request.GET.get('page')
-    try:
-        variants = paginator.page(page)
-    except PageNotAnInteger:
-        variants = paginator.page(1)
-    except EmptyPage:
-        variants = paginator.page(paginator.num_pages)
+    variants = CursorPaginator(
+        variants, 15, ordering=('stock_quantity', 'product__product_name', 'id')
+    ).page(request.GET.get('cursor'))
         
     context = {
         'variants': variants, 'categories': categories, 'query': query,
@@ -55,8 +50,7 @@ def update_stock(request, variant_id):
         try:
             new_stock = int(request.POST.get('stock_quantity', 0))
             if new_stock >= 0:
-                variant.stock_quantity = new_stock
-                variant.save()
+                set_stock(variant, new_stock)
                 messages.success(request, f"Stock updated for {variant.product.product_name} - {variant.get_color_display()}")
             else:
                 messages.error(request, "Stock quantity cannot be negative")
@@ -1,4 +1,5 @@
 from .common_imports import *
+from vault.refunds import RefundError, cancel_order
 
 @never_cache
 @login_required
@@ -36,10 +37,7 @@ def order_management_page(request):
         except ValueError:
             date_to = ''
             
-    if sort_order == 'asc':
-        orders = orders.order_by('created_at')
-    else:
-        orders = orders.order_by('-created_at')
+    ordering = ('created_at', 'id') if sort_order == 'asc' else ('-created_at', '-id')
         
     total_orders = Order.objects.count()
     pending_orders = Order.objects.filter(status='pending').count()
@@ -47,14 +45,7 @@ def order_management_page(request):
     cancelled_orders = Order.objects.filter(status='cancelled').count()
     total_revenue = Order.objects.filter(status='delivered').aggregate(total=Sum('total_amount'))['total'] or 0
     
-    paginator = Paginator(orders, 10)
-    page = request.GET.get('page')
-    try:
-        orders = paginator.page(page)
-    except PageNotAnInteger:
-        orders = paginator.page(1)
-    except EmptyPage:
-        orders = paginator.page(paginator.num_pages)
+    orders = CursorPaginator(orders, 10, ordering=ordering).page(request.GET.get('cursor'))
         
     context = {
         'orders':orders, 'query': query, 'status_filter': status_filter,
@@ -102,15 +93,20 @@ def update_order_status(request, order_id):
     if request.method == 'POST':
         new_status = request.POST.get('status')
         
-        if new_status in dict(Order.ORDER_STATUS_CHOICES):
-            old_status = order.status
+        if new_status == 'cancelled' and order.status != 'cancelled':
+            try:
+                refund_amount = cancel_order(order.id)
+            except RefundError as e:
+                messages.error(request, str(e))
+                return redirect('order_detail_view', order_id=order.id)
+            
+            if refund_amount:
+                messages.success(request, f"Order {order.order_number} cancelled and ₹{refund_amount} refunded to {order.user.full_name}'s wallet")
+            else:
+                messages.success(request, f"Order {order.order_number} status updated to Cancelled")
+        elif new_status in dict(Order.ORDER_STATUS_CHOICES):
             order.status = new_status
             order.save()
-            
-            if new_status == 'cancelled' and old_status != 'cancelled':
-                for item in order.items.all():
-                    item.variant.stock_quantity += item.quantity
-                    item.variant.save()
                     
             messages.success(request, f"Order {order.order_number} status updated to {order.get_status_display()}")
         else:
@@ -1,4 +1,5 @@
 from .common_imports import *
+from vault.search import search_products
 
 @never_cache
 @login_required
@@ -26,22 +27,7 @@ def product_list(request):
             pass
 
     if query:
-        search_terms = re.findall(r'\w+', query.lower())
-        if search_terms:
-            search_query = Q()
-            for term in search_terms:
-                search_query |= (
-                    Q(product_name__icontains=term) |
-                    Q(product_description__icontains=term) |
-                    Q(category__name__icontains=term)
-                )
-            products = products.filter(search_query)
-        else:
-            products = products.filter(
-                Q(product_name__icontains=query) |
-                Q(product_description__icontains=query) |
-                Q(category__name__icontains=query)
-            )
+        products = search_products(products, query)
 
     if sort_order == 'asc':
         products = products.order_by('created_at')
@@ -554,11 +540,11 @@ def toggle_variant_status(request, variant_id):
         
         if action == 'deactivate' and variant.is_active:
             variant.is_active = False
-            variant.save()
+            variant.save(update_fields=['is_active', 'updated_at'])
             messages.success(request, f"Variant '{variant_color}' has been deactivated successfully")
         elif action == 'activate' and not variant.is_active:
             variant.is_active = True
-            variant.save()
+            variant.save(update_fields=['is_active', 'updated_at'])
             messages.success(request, f"Variant '{variant_color}' has been activated successfully")
         else:
             messages.error(request, "Invalid action or variant status")
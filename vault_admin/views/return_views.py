@@ -1,4 +1,5 @@
 from .common_imports import *
+from vault.refunds import approve_returns
 
 @login_required
 @user_passes_test(lambda u: u.is_staff)
@@ -113,29 +114,15 @@ def verify_return_request(request, return_request_id):
                     messages.error(request, "This return request has already been processed.")
                     return redirect('return_requests_page')
 
-                return_request.status = 'approved'
-                return_request.admin_notes = admin_notes
-                return_request.processed_at = timezone.now()
-                return_request.processed_by = request.user
-                return_request.save()
-
-                order = return_request.order
-                order.status = 'returned'
-                order.save()
-
-                for item in order.items.all():
-                    item.variant.stock_quantity += item.quantity
-                    item.variant.save()
-
-                wallet, created = Wallet.objects.get_or_create(user=order.user)
-                wallet.add_money(
-                    order.total_amount,
-                    f"Refund for returned order {order.order_number}"
+                approved = approve_returns(
+                    order_return_ids=[return_request.id],
+                    processed_by=request.user,
+                    admin_notes=admin_notes
                 )
                 
                 messages.success(
                     request, 
-                    f"Return request approved successfully. ₹{order.total_amount} has been added to {order.user.full_name}'s wallet."
+                    f"Return request approved successfully. ₹{approved.refunded} has been added to {return_request.order.user.full_name}'s wallet."
                 )
                 
             elif action == 'reject':
@@ -183,33 +170,15 @@ def verify_item_return_request(request, item_return_id):
                     messages.error(request, "This return request has already been processed.")
                     return redirect('return_requests_page')
                 
-                # Update return request
-                item_return.status = 'approved'
-                item_return.admin_notes = admin_notes
-                item_return.processed_at = timezone.now()
-                item_return.processed_by = request.user
-                item_return.save()
-                
-                # Update order item status
-                order_item = item_return.order_item
-                order_item.status = 'returned'
-                order_item.save()
-                
-                # Restore stock
-                order_item.variant.stock_quantity += order_item.quantity
-                order_item.variant.save()
-                
-                # Add refund to wallet
-                wallet, created = Wallet.objects.get_or_create(user=order_item.order.user)
-                refund_amount = order_item.get_total_price()
-                wallet.add_money(
-                    refund_amount,
-                    f"Refund for returned item: {order_item.product.product_name} from order {order_item.order.order_number}"
+                approved = approve_returns(
+                    item_return_ids=[item_return.id],
+                    processed_by=request.user,
+                    admin_notes=admin_notes
                 )
                 
                 messages.success(
                     request, 
-                    f"Item return approved successfully. ₹{refund_amount} has been added to {order_item.order.user.full_name}'s wallet."
+                    f"Item return approved successfully. ₹{approved.refunded} has been added to {item_return.order_item.order.user.full_name}'s wallet."
                 )
                 
             elif action == 'reject':
@@ -237,4 +206,43 @@ def verify_item_return_request(request, item_return_id):
         except Exception as e:
             messages.error(request, f"An error occurred while processing the return request: {str(e)}")
     
-    return redirect('return_requests_page')
\ No newline at end of file
+    return redirect('return_requests_page')
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+@require_http_methods(["POST"])
+def bulk_approve_returns(request):
+    # Checkbox values look like "order:12" or "item:34"
+    order_return_ids = []
+    item_return_ids = []
+    for value in request.POST.getlist('selected'):
+        request_type, _, request_id = value.partition(':')
+        if not request_id.isdigit():
+            continue
+        if request_type == 'order':
+            order_return_ids.append(int(request_id))
+        elif request_type == 'item':
+            item_return_ids.append(int(request_id))
+    
+    if not order_return_ids and not item_return_ids:
+        messages.error(request, "Select at least one pending return request to approve.")
+        return redirect('return_requests_page')
+    
+    try:
+        approved = approve_returns(
+            order_return_ids=order_return_ids,
+            item_return_ids=item_return_ids,
+            processed_by=request.user,
+            admin_notes=request.POST.get('admin_notes', '').strip()
+        )
+    except Exception as e:
+        messages.error(request, f"An error occurred while approving the return requests: {str(e)}")
+        return redirect('return_requests_page')
+    
+    count = len(approved.order_returns) + len(approved.item_returns)
+    skipped = len(order_return_ids) + len(item_return_ids) - count
+    message = f"Approved {count} return request{'s' if count != 1 else ''} and refunded ₹{approved.refunded} to customer wallets."
+    if skipped:
+        message += f" {skipped} already processed request{'s were' if skipped != 1 else ' was'} skipped."
+    messages.success(request, message)
+    return redirect('return_requests_page')
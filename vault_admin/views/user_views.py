@@ -21,19 +21,8 @@ def user_management_page(request):
     elif status == 'blocked':
         user_list = user_list.filter(is_active=False)
 
-    if sort_order == 'asc':
-        user_list = user_list.order_by('created_at')
-    else:
-        user_list = user_list.order_by('-created_at')
-
-    paginator = Paginator(user_list, 10)
-    page = request.GET.get('page')
-    try:
-        users = paginator.page(page)
-    except PageNotAnInteger:
-        users = paginator.page(1)
-    except EmptyPage:
-        users = paginator.page(paginator.num_pages)
+    ordering = ('created_at', 'id') if sort_order == 'asc' else ('-created_at', '-id')
+    users = CursorPaginator(user_list, 10, ordering=ordering).page(request.GET.get('cursor'))
 
     active_count = User.objects.filter(is_active=True, is_staff=False).count()
     blocked_count = User.objects.filter(is_active=False, is_staff=False).count()
@@ -19,10 +19,7 @@ def wallet_management_page(request):
     if transaction_type != 'all':
         transactions = transactions.filter(transaction_type=transaction_type)
         
-    if sort_order == 'asc':
-        transactions = transactions.order_by('created_at')
-    else:
-        transactions = transactions.order_by('-created_at')
+    ordering = ('created_at', 'id') if sort_order == 'asc' else ('-created_at', '-id')
         
     total_transactions = WalletTransaction.objects.count()
     credit_transactions = WalletTransaction.objects.filter(transaction_type='credit').count()
@@ -30,14 +27,7 @@ def wallet_management_page(request):
     total_credit_amount = WalletTransaction.objects.filter(transaction_type='credit').aggregate(total=Sum('amount'))['total'] or 0
     total_debit_amount = WalletTransaction.objects.filter(transaction_type='debit').aggregate(total=Sum('amount'))['total'] or 0
     
-    paginator = Paginator(transactions, 7)
-    page = request.GET.get('page')
-    try:
-        transactions = paginator.page(page)
-    except PageNotAnInteger:
-        transactions = paginator.page(1)
-    except EmptyPage:
-        transactions = paginator.page(paginator.num_pages)
+    transactions = CursorPaginator(transactions, 7, ordering=ordering).page(request.GET.get('cursor'))
         
     context = {
         'transactions': transactions,